@@ -0,0 +1,181 @@
+"""
+Audio output sinks for the Memento Cognitio receiver.
+
+A sink receives PcmAudio clips from the playback stage. The default sink
+keeps a single output stream open and writes Piper's raw PCM straight into
+it, so there is no WAV round trip or player process per utterance. The file
+and null sinks make the receiver usable headless and under test.
+"""
+
+import time
+import wave
+import threading
+
+
+# Size of each write into the output stream; small enough to stop promptly
+BLOCK_SECONDS = 0.05
+
+
+class AudioSink:
+    """Base class: writes PcmAudio clips to some output"""
+
+    name = "base"
+    # Whether back-to-back short clips play without audible gaps, so
+    # playback can be split up to stop mid-sentence
+    gapless = True
+
+    def __init__(self):
+        self.format = None
+        self.clips = 0
+        self.seconds = 0.0
+        self._lock = threading.Lock()
+
+    def write(self, audio):
+        """Play or store one clip; blocks until it has been handed off"""
+        fmt = (audio.sample_rate, audio.sample_width, audio.channels)
+
+        with self._lock:
+            if fmt != self.format:
+                if self.format is not None:
+                    self._close()
+                self._open(*fmt)
+                self.format = fmt
+
+            self._write(audio)
+            self.clips += 1
+            self.seconds += audio.duration
+
+    def close(self):
+        with self._lock:
+            if self.format is not None:
+                self._close()
+                self.format = None
+
+    def _open(self, sample_rate, sample_width, channels):
+        pass
+
+    def _write(self, audio):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+
+class NullSink(AudioSink):
+    """Discards audio, optionally taking as long as it would to play it"""
+
+    name = "null"
+
+    def __init__(self, realtime=False):
+        super().__init__()
+        self.realtime = realtime
+
+    def _write(self, audio):
+        if self.realtime:
+            time.sleep(audio.duration)
+
+
+class FileSink(AudioSink):
+    """Appends every clip to one WAV file"""
+
+    name = "file"
+
+    def __init__(self, path):
+        super().__init__()
+        self.path = path
+        self._wav = None
+        self._opened = 0
+
+    def _open(self, sample_rate, sample_width, channels):
+        # A format change starts a new numbered file next to the first one
+        path = str(self.path)
+        if self._opened:
+            path = path.replace(".wav", f".{self._opened}.wav")
+        self._opened += 1
+
+        self._wav = wave.open(path, "wb")
+        self._wav.setnchannels(channels)
+        self._wav.setsampwidth(sample_width)
+        self._wav.setframerate(sample_rate)
+
+    def _write(self, audio):
+        self._wav.writeframes(audio.pcm)
+
+    def _close(self):
+        self._wav.close()
+        self._wav = None
+
+
+class StreamSink(AudioSink):
+    """Keeps one sounddevice output stream open and writes raw PCM into it"""
+
+    name = "stream"
+
+    def __init__(self, device=None):
+        super().__init__()
+        import sounddevice
+
+        self._sounddevice = sounddevice
+        self.device = device
+        self._stream = None
+
+    def _open(self, sample_rate, sample_width, channels):
+        self._stream = self._sounddevice.RawOutputStream(
+            samplerate=sample_rate,
+            channels=channels,
+            dtype=f"int{sample_width * 8}",
+            device=self.device,
+        )
+        self._stream.start()
+
+    def _write(self, audio):
+        block = max(audio.frame_size, int(audio.sample_rate * BLOCK_SECONDS) * audio.frame_size)
+        pcm = memoryview(audio.pcm)
+
+        for offset in range(0, len(pcm), block):
+            self._stream.write(pcm[offset:offset + block])
+
+    def _close(self):
+        self._stream.stop()
+        self._stream.close()
+        self._stream = None
+
+
+class PydubSink(AudioSink):
+    """Per-clip playback through pydub; used when sounddevice is unavailable"""
+
+    name = "pydub"
+    gapless = False
+
+    def __init__(self):
+        super().__init__()
+        from pydub import playback, AudioSegment
+
+        self._playback = playback
+        self._segment = AudioSegment
+
+    def _write(self, audio):
+        self._playback.play(self._segment(
+            data=audio.pcm,
+            sample_width=audio.sample_width,
+            frame_rate=audio.sample_rate,
+            channels=audio.channels,
+        ))
+
+
+def create_sink(kind="auto", path=None):
+    """Build a sink by name: auto, stream, pydub, file or null"""
+    if kind == "null":
+        return NullSink()
+    if kind == "file":
+        return FileSink(path or "receiver-output.wav")
+    if kind == "pydub":
+        return PydubSink()
+    if kind == "stream":
+        return StreamSink()
+
+    try:
+        return StreamSink()
+    except (ImportError, OSError) as e:
+        print(f"sounddevice unavailable ({e}), falling back to pydub playback")
+        return PydubSink()
@@ -0,0 +1,428 @@
+"""
+Replay benchmark for the Memento Cognitio receiver.
+
+Drives MementoReceiver against a simulated Memento-Cam: a stand-in BLE
+client that replays notification streams split into MTU-sized packets and
+paced by the connection interval. Messages are synthetic responses sized
+for each PROMPT_MODES entry, or a recorded stream (JSON lines with "text" or
+"message", optional "mode" and "delay"/"time" - a session's history
+index.jsonl works as-is).
+
+For every prompt mode it reports notification-to-first-audio latency,
+synthesis real-time factor, peak queue depths and peak memory, and saves the
+results as JSON for later comparison:
+
+    python bt-receiver/benchmark.py --messages 3
+    python bt-receiver/benchmark.py --compare bt-receiver/benchmarks/baseline.json
+"""
+
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import datetime
+import tempfile
+import contextlib
+import tracemalloc
+import importlib.util
+from pathlib import Path
+
+import main
+from speech import PcmAudio
+from audio_sink import NullSink
+from framing import encode_frame, FRAME_HEADER, FRAME_FLAG_CAPABILITIES, FRAME_FLAG_DEFLATE
+from tracing import percentile
+
+
+RESULTS_DIR = main.BASE_DIR / "benchmarks"
+FIRMWARE_CONSTANTS = main.BASE_DIR.parent / "firmware" / "constants.py"
+
+# Typical response length in words for each prompt mode
+MODE_WORDS = {
+    "shutter": 20,
+    "up": 30,
+    "down": 40,
+    "left": 50,
+    "right": 100,
+    "select": 12,
+    "ok": 25,
+}
+
+VOCABULARY = (
+    "the a small old bright wooden metal cup laptop window light table chair "
+    "plant book phone shelf warm quiet calm busy red blue green soft sharp "
+    "sits rests glows waits leans near beside under behind across room desk "
+    "morning evening shadow corner street sky robot cat dog kitchen garden"
+).split()
+
+# Default BLE link: 247-byte ATT MTU, 15 ms connection interval
+DEFAULT_MTU = 247
+DEFAULT_INTERVAL_MS = 15.0
+DEFAULT_PACKETS_PER_INTERVAL = 4
+# Mirrors BLE_COMPRESS_MIN_BYTES in firmware/constants.py
+DEFAULT_COMPRESS_MIN_BYTES = 160
+
+
+def load_prompt_modes():
+    """Import PROMPT_MODES from the firmware without putting it on sys.path"""
+    spec = importlib.util.spec_from_file_location("firmware_constants", FIRMWARE_CONSTANTS)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.PROMPT_MODES
+
+
+def synthetic_message(mode, rng):
+    """A deterministic stand-in for a Gemini response in the given mode"""
+    words = MODE_WORDS.get(mode, 30)
+
+    if mode == "up":
+        items = [" ".join(rng.choice(VOCABULARY) for _ in range(rng.randint(1, 3)))
+                 for _ in range(max(1, words // 2))]
+        return "\n".join(f"* {item.capitalize()}" for item in items)
+
+    sentences = []
+    remaining = words
+    while remaining > 0:
+        length = min(remaining, rng.randint(6, 14))
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(length))
+        if length > 9:
+            cut = rng.randint(3, length - 3)
+            parts = sentence.split()
+            sentence = " ".join(parts[:cut]) + ", " + " ".join(parts[cut:])
+        sentences.append(sentence.capitalize() + rng.choice([".", ".", ".", "!"]))
+        remaining -= length
+    return " ".join(sentences)
+
+
+def load_recording(path, max_gap):
+    """Group a recorded JSON-lines stream by prompt mode"""
+    by_mode = {}
+    previous = None
+
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get("text") or record.get("message")
+            if not text:
+                continue
+
+            delay = record.get("delay")
+            if delay is None and "time" in record:
+                delay = min(record["time"] - previous, max_gap) if previous is not None else 0.0
+                previous = record["time"]
+
+            by_mode.setdefault(record.get("mode", "shutter"), []).append({"text": text, "delay": delay})
+
+    return by_mode
+
+
+class SimulatedCamera:
+    """Replays messages as BLE notifications the way the firmware sends them"""
+
+    address = "00:00:00:00:00:00"
+
+    def __init__(self, messages, mtu=DEFAULT_MTU, interval=DEFAULT_INTERVAL_MS / 1000,
+                 packets_per_interval=DEFAULT_PACKETS_PER_INTERVAL, gap=0.5, framed=True,
+                 compress_min=DEFAULT_COMPRESS_MIN_BYTES):
+        self.name = main.DEVICE_NAME
+        self.messages = messages
+        self.payload_size = max(1, mtu - 3)
+        self.interval = interval
+        self.packets_per_interval = max(1, packets_per_interval)
+        self.gap = gap
+        self.framed = framed
+        self.compress_min = compress_min
+        # Flags the receiver announced in its capabilities frame
+        self.peer_flags = 0
+        self.sent_at = []
+        self.packets = 0
+        self.bytes = 0
+
+    def receive(self, data):
+        """A write from the receiver to the camera's RX characteristic"""
+        _, flags, _, length = FRAME_HEADER.unpack_from(data)
+        if flags & FRAME_FLAG_CAPABILITIES and length:
+            self.peer_flags = data[FRAME_HEADER.size]
+
+    def encode(self, message_id, text):
+        if self.framed:
+            flags = 0
+            if (self.compress_min and self.peer_flags & FRAME_FLAG_DEFLATE
+                    and len(text.encode("utf-8")) >= self.compress_min):
+                flags = FRAME_FLAG_DEFLATE
+            return encode_frame(message_id, text, flags)
+        return (text.replace("\n", " ") + "\n").encode("utf-8")
+
+    async def replay(self, callback):
+        for message_id, message in enumerate(self.messages, start=1):
+            delay = message.get("delay")
+            await asyncio.sleep(self.gap if delay is None else delay)
+
+            data = self.encode(message_id, message["text"])
+            self.sent_at.append(time.monotonic())
+
+            for n, offset in enumerate(range(0, len(data), self.payload_size)):
+                if n and n % self.packets_per_interval == 0:
+                    await asyncio.sleep(self.interval)
+                callback(None, bytearray(data[offset:offset + self.payload_size]))
+                self.packets += 1
+            self.bytes += len(data)
+
+
+class SimulatedClient:
+    """Stands in for BleakClient; disconnects once the camera has sent everything"""
+
+    def __init__(self, device, disconnected_callback=None, timeout=None):
+        self.device = device
+        self.is_connected = False
+        self.disconnected_callback = disconnected_callback
+        self._replay = None
+
+    async def __aenter__(self):
+        self.is_connected = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.is_connected = False
+        if self._replay:
+            self._replay.cancel()
+
+    async def start_notify(self, uuid, callback):
+        self._replay = asyncio.create_task(self._run(callback))
+
+    async def write_gatt_char(self, uuid, data, response=None):
+        self.device.receive(data)
+
+    async def _run(self, callback):
+        try:
+            await self.device.replay(callback)
+        finally:
+            self.is_connected = False
+            if self.disconnected_callback:
+                self.disconnected_callback(self)
+
+
+class SimulatedVoice:
+    """Stands in for the Piper voice: silence produced at a fixed speed"""
+
+    # Roughly how fast Piper voices speak
+    SPOKEN_CHARS_PER_SECOND = 14.0
+
+    def __init__(self, chars_per_second, sample_rate=22050):
+        self.chars_per_second = chars_per_second
+        self.sample_rate = sample_rate
+
+    def synthesize(self, text):
+        time.sleep(len(text) / self.chars_per_second)
+        frames = int(len(text) / self.SPOKEN_CHARS_PER_SECOND * self.sample_rate)
+        return PcmAudio(bytes(frames * 2), self.sample_rate)
+
+    def warm_up(self):
+        return 0.0, 0.0
+
+
+async def sample_queues(pipeline, depths, period=0.02):
+    while True:
+        stats = pipeline.stats()
+        depths["synthesis"] = max(depths["synthesis"], stats["synthesis_queue"])
+        depths["playback"] = max(depths["playback"], stats["playback_queue"])
+        await asyncio.sleep(period)
+
+
+async def run_mode(mode, messages, args, history_dir):
+    camera = SimulatedCamera(
+        messages,
+        mtu=args.mtu,
+        interval=args.interval_ms / 1000,
+        packets_per_interval=args.packets_per_interval,
+        gap=args.gap,
+        framed=not args.legacy,
+        compress_min=0 if args.no_compress else DEFAULT_COMPRESS_MIN_BYTES,
+    )
+    receiver = main.MementoReceiver(
+        workers=args.workers,
+        executor=args.executor,
+        max_pending=args.max_pending,
+        stream=not args.whole_message,
+        barge_in=args.barge_in,
+        max_age=args.max_age,
+        stale=args.stale,
+        use_cache=args.cache,
+        history_dir=history_dir,
+        known_cameras=None,
+        trace=False,
+        sink=NullSink(realtime=not args.instant_playback),
+        client_class=SimulatedClient,
+    )
+
+    latencies = []
+    record_history = receiver.speech.on_played
+
+    def on_played(job):
+        latencies.append(job.first_audio_at - camera.sent_at[job.seq - 1])
+        record_history(job)
+
+    receiver.speech.on_played = on_played
+    depths = {"synthesis": 0, "playback": 0}
+
+    await receiver.speech.start()
+    await receiver.speech.ready.wait()
+    tracemalloc.reset_peak()
+    sampler = asyncio.create_task(sample_queues(receiver.speech, depths))
+
+    try:
+        # Straight to the camera; scanning is not part of what is measured
+        await receiver.connect_and_listen(camera)
+        await receiver.speech.drain()
+    finally:
+        sampler.cancel()
+        stats = receiver.speech.stats()
+        await receiver.speech.stop()
+        receiver.audio_history.close()
+
+    _, peak = tracemalloc.get_traced_memory()
+    return {
+        "messages": len(messages),
+        "avg_chars": sum(len(m["text"]) for m in messages) / len(messages),
+        "packets": camera.packets,
+        "ble_bytes": camera.bytes,
+        "played": stats["played"],
+        "dropped": stats["dropped"],
+        "interrupted": stats["interrupted"],
+        "superseded": stats["superseded"],
+        "stale": stats["stale"],
+        "skipped_chars": stats["skipped_chars"],
+        "ttfa_p50": percentile(latencies, 0.5),
+        "ttfa_p95": percentile(latencies, 0.95),
+        "ttfa_max": max(latencies) if latencies else None,
+        "real_time_factor": stats["real_time_factor"],
+        "max_synthesis_queue": depths["synthesis"],
+        "max_playback_queue": depths["playback"],
+        "peak_traced_mb": peak / (1024 * 1024),
+    }
+
+
+def max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes elsewhere
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def format_value(value):
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def print_results(results):
+    columns = ["messages", "avg_chars", "ble_bytes", "ttfa_p50", "ttfa_p95", "real_time_factor",
+               "max_synthesis_queue", "max_playback_queue", "dropped", "skipped_chars", "peak_traced_mb"]
+    print(f"{'mode':<8} " + " ".join(f"{c:>19}" for c in columns))
+    for mode, row in results["modes"].items():
+        print(f"{mode:<8} " + " ".join(f"{format_value(row[c]):>19}" for c in columns))
+    print(f"max RSS: {format_value(results['max_rss_mb'])} MB")
+
+
+def print_comparison(results, baseline):
+    print(f"\nCompared with {baseline['created']}:")
+    for mode, row in results["modes"].items():
+        before = baseline["modes"].get(mode)
+        if not before:
+            continue
+        for metric in ("ttfa_p50", "ttfa_p95", "real_time_factor", "peak_traced_mb"):
+            old, new = before.get(metric), row.get(metric)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            print(f"  {mode:<8} {metric:<18} {old:8.3f} -> {new:8.3f} ({change:+.1f}%)")
+
+
+async def run(args):
+    if args.replay:
+        by_mode = load_recording(args.replay, args.max_gap)
+    else:
+        rng = random.Random(args.seed)
+        modes = args.modes or list(load_prompt_modes())
+        by_mode = {mode: [{"text": synthetic_message(mode, rng)} for _ in range(args.messages)]
+                   for mode in modes}
+
+    if args.fake_tts:
+        main.TTS_VOICE = SimulatedVoice(args.fake_tts)
+
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "modes": {},
+    }
+
+    tracemalloc.start()
+    with tempfile.TemporaryDirectory() as history_dir:
+        for mode, messages in by_mode.items():
+            print(f"Benchmarking '{mode}' ({len(messages)} messages)...")
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                results["modes"][mode] = await run_mode(mode, messages, args, history_dir)
+    tracemalloc.stop()
+    results["max_rss_mb"] = max_rss_mb()
+
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Replay benchmark for the Memento receiver")
+    parser.add_argument("--messages", type=int, default=3, help="synthetic messages per prompt mode")
+    parser.add_argument("--modes", nargs="*", help="prompt modes to run (default: all)")
+    parser.add_argument("--replay", type=Path, help="recorded JSON-lines stream to replay instead")
+    parser.add_argument("--max-gap", type=float, default=2.0, help="cap on recorded inter-message gaps (s)")
+    parser.add_argument("--gap", type=float, default=0.5, help="gap between synthetic messages (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--mtu", type=int, default=DEFAULT_MTU)
+    parser.add_argument("--interval-ms", type=float, default=DEFAULT_INTERVAL_MS)
+    parser.add_argument("--packets-per-interval", type=int, default=DEFAULT_PACKETS_PER_INTERVAL)
+    parser.add_argument("--legacy", action="store_true", help="send newline-terminated text instead of frames")
+    parser.add_argument("--no-compress", action="store_true", help="never DEFLATE long frames")
+    parser.add_argument("--workers", type=int, default=main.SYNTHESIS_WORKERS)
+    parser.add_argument("--executor", choices=["thread", "process"], default=main.SYNTHESIS_EXECUTOR)
+    parser.add_argument("--max-pending", type=int, default=main.MAX_PENDING_MESSAGES)
+    parser.add_argument("--whole-message", action="store_true", help="disable sentence streaming")
+    parser.add_argument("--barge-in", action="store_true", help="let each new message cut off the one playing")
+    parser.add_argument("--max-age", type=float, default=0.0, help="seconds before a waiting message is stale (0: never)")
+    parser.add_argument("--stale", choices=["shorten", "drop"], default=main.STALE_MESSAGES,
+                        help="what happens to stale messages")
+    parser.add_argument("--cache", action="store_true", help="enable the speech cache")
+    parser.add_argument("--instant-playback", action="store_true", help="do not play audio in real time")
+    parser.add_argument("--fake-tts", type=float, metavar="CHARS_PER_S",
+                        help="replace Piper with silence synthesized at this speed")
+    parser.add_argument("--output", type=Path, help="results file (default: benchmarks/results-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the receiver's own output")
+    return parser.parse_args()
+
+
+def main_cli():
+    args = parse_args()
+    results = asyncio.run(run(args))
+    print_results(results)
+
+    output = args.output or RESULTS_DIR / f"results-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2, default=str))
+    print(f"Results saved to {output}")
+
+    if args.compare:
+        print_comparison(results, json.loads(args.compare.read_text()))
+
+
+if __name__ == "__main__":
+    main_cli()
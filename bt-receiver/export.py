@@ -0,0 +1,371 @@
+"""
+Batch export of a Memento Cognitio session to one audio file.
+
+Takes the messages of a session and writes them, in order, to a single WAV
+file with a JSON-lines index next to it giving each message's timestamp,
+text and position in the audio, so a player can seek straight to it.
+
+Messages can come from a history session directory (or its index.jsonl), a
+JSON-lines transcript with "text" or "message" on every line (recorded
+streams for benchmark.py work as-is), or plain text with one message per
+line. Audio the history already holds is copied. Anything missing, such as
+messages from a transcript or ones cut short by barge-in, is synthesized
+again sentence by sentence on a process pool, with one PiperVoice per
+worker. Sentences in the speech cache are not synthesized again.
+
+    python bt-receiver/export.py bt-receiver/history/20261017-091500
+    python bt-receiver/export.py transcript.jsonl --workers 4 --output day.wav
+"""
+
+import os
+import sys
+import json
+import mmap
+import time
+import wave
+import argparse
+import datetime
+import contextlib
+import collections
+import concurrent.futures
+from pathlib import Path
+
+import speech
+from speech import PcmAudio, split_sentences
+from history import AUDIO_FILE, INDEX_FILE, load_session
+
+
+# Silence between messages in the exported audio
+GAP_SECONDS = 0.6
+# Written into a session's directory when no output is given
+EXPORT_FILE = "session.wav"
+# Sentences queued per worker ahead of the one being written, which bounds
+# the synthesized PCM held in memory
+TASKS_PER_WORKER = 4
+
+
+def index_path(output):
+    """The seek index written next to an exported audio file"""
+    output = Path(output)
+    return output.with_name(output.stem + ".index.jsonl")
+
+
+def history_entries(history):
+    """Messages of a live AudioHistory, without audio where it was cut short"""
+    entries = []
+    for i, meta in enumerate(history.entries()):
+        complete = meta.get("complete", True)
+        entries.append({
+            "timestamp": meta["timestamp"],
+            "message": meta["message"],
+            "audio": history.audio(i) if complete else None,
+        })
+    return entries
+
+
+@contextlib.contextmanager
+def session_entries(directory):
+    """Messages of a closed history session, with audio memory-mapped.
+    
+    The mapping is closed when the with block ends; the entries' audio is
+    not readable after that.
+    """
+    directory = Path(directory)
+    records = load_session(directory)
+    with contextlib.ExitStack() as stack:
+        view = None
+        if any(record.get("offset") is not None for record in records):
+            f = stack.enter_context(open(directory / AUDIO_FILE, "rb"))
+            mapped = stack.enter_context(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            # Every view is released before the mapping can close
+            view = stack.enter_context(memoryview(mapped))
+
+        entries = []
+        for record in records:
+            audio = None
+            if record.get("offset") is not None and record.get("complete", True):
+                start = record["offset"]
+                pcm = stack.enter_context(view[start:start + record["length"]])
+                audio = PcmAudio(pcm, record["sample_rate"], record["sample_width"], record["channels"])
+            entries.append({"timestamp": record["timestamp"], "message": record["message"], "audio": audio})
+        yield entries
+
+
+def transcript_entries(path):
+    """Messages of a JSON-lines or plain text transcript"""
+    entries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                text = record.get("text") or record.get("message")
+                timestamp = record.get("timestamp")
+                if timestamp is None and "time" in record:
+                    timestamp = datetime.datetime.fromtimestamp(record["time"]).strftime("%H:%M:%S")
+            else:
+                text, timestamp = line, None
+            if text:
+                entries.append({"timestamp": timestamp, "message": text, "audio": None})
+    return entries
+
+
+@contextlib.contextmanager
+def load_transcript(path):
+    """Messages from a session directory, its index, JSON lines or plain text"""
+    path = Path(path)
+    if path.is_dir():
+        with session_entries(path) as entries:
+            yield entries
+    elif path.name == INDEX_FILE and (path.parent / AUDIO_FILE).exists():
+        with session_entries(path.parent) as entries:
+            yield entries
+    else:
+        yield transcript_entries(path)
+
+
+class ExportWriter:
+    """Appends messages to one WAV file and records where each one starts"""
+
+    def __init__(self, output, gap=GAP_SECONDS):
+        self.output = Path(output)
+        self.gap = gap
+        self.format = None
+        self.frames = 0
+        self._wav = None
+        self._index = None
+
+    def write(self, entry, audio, source):
+        fmt = (audio.sample_rate, audio.sample_width, audio.channels)
+        if self._wav is None:
+            self.output.parent.mkdir(parents=True, exist_ok=True)
+            self._wav = wave.open(str(self.output), "wb")
+            self._wav.setframerate(audio.sample_rate)
+            self._wav.setsampwidth(audio.sample_width)
+            self._wav.setnchannels(audio.channels)
+            self._index = open(index_path(self.output), "w", encoding="utf-8")
+            self.format = fmt
+        elif fmt != self.format:
+            raise ValueError(f"Message {entry['message'][:40]!r} has audio format {fmt}, the export is {self.format}")
+        elif self.gap:
+            silence = int(self.gap * audio.sample_rate)
+            self._wav.writeframes(bytes(silence * audio.frame_size))
+            self.frames += silence
+
+        frames = len(audio.pcm) // audio.frame_size
+        self._index.write(json.dumps({
+            "seq": entry["seq"],
+            "timestamp": entry["timestamp"],
+            "message": entry["message"],
+            "start": self.frames / audio.sample_rate,
+            "duration": audio.duration,
+            "frame": self.frames,
+            "frames": frames,
+            "source": source,
+        }) + "\n")
+        self._wav.writeframes(audio.pcm)
+        self.frames += frames
+
+    @property
+    def duration(self):
+        return self.frames / self.format[0] if self.format else 0.0
+
+    def close(self):
+        if self._wav is not None:
+            self._wav.close()
+            self._index.close()
+            self._wav = None
+            self._index = None
+
+
+def export_session(entries, output, model_path, params=None, workers=None, cache=None, gap=GAP_SECONDS):
+    """Write entries to output and its index; returns export statistics.
+
+    Sentences to synthesize are planned up front so the pool stays busy and
+    are written back in order as their message comes up.
+    """
+    workers = max(1, workers or os.cpu_count() or 1)
+    entries = [dict(entry, seq=seq) for seq, entry in enumerate(entries, 1) if entry["message"].strip()]
+    stats = {
+        "messages": len(entries),
+        "from_history": 0,
+        "workers": workers,
+        "cached_chars": 0,
+        "synthesized_chars": 0,
+        "wall_seconds": 0.0,
+        "synthesis_task_seconds": 0.0,
+        "voice_load_seconds": None,
+    }
+
+    # Each message is copied from the history or built from its sentences,
+    # each either in the speech cache or queued for the pool. Cached clips
+    # are only read when their message is written.
+    plans = []
+    tasks = []
+    for entry in entries:
+        if entry["audio"] is not None:
+            plans.append(None)
+            continue
+        plan = []
+        for segment in split_sentences(entry["message"]):
+            cached = cache is not None and segment in cache
+            if not cached:
+                tasks.append(segment)
+            plan.append((segment, cached))
+        plans.append(plan)
+
+    writer = ExportWriter(output, gap)
+    pool = None
+    pending = collections.deque()
+    queued = iter(tasks)
+
+    def start_pool():
+        nonlocal pool
+        size = min(workers, max(1, len(tasks)))
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=size,
+            initializer=speech.init_worker,
+            initargs=(str(model_path), params),
+        )
+        started = time.perf_counter()
+        warm_ups = [pool.submit(speech.warm_up_worker) for _ in range(size)]
+        stats["voice_load_seconds"] = max(future.result()[0] for future in warm_ups)
+        print(f"Voices ready on {size} worker(s) in {time.perf_counter() - started:.2f}s")
+
+    def refill():
+        while len(pending) < workers * TASKS_PER_WORKER:
+            text = next(queued, None)
+            if text is None:
+                return
+            pending.append((text, pool.submit(speech.synthesize_timed_in_worker, text)))
+
+    def synthesized(future):
+        audio, seconds = future.result()
+        stats["synthesis_task_seconds"] += seconds
+        return audio
+
+    try:
+        if tasks:
+            start_pool()
+        started = time.perf_counter()
+
+        for entry, plan in zip(entries, plans):
+            if plan is None:
+                writer.write(entry, entry["audio"], "history")
+                stats["from_history"] += 1
+                continue
+
+            clips = []
+            source = "cache"
+            for segment, cached in plan:
+                audio = cache.get(segment) if cached else None
+                if audio is not None:
+                    stats["cached_chars"] += len(segment)
+                else:
+                    if cached:
+                        # Evicted since planning, most likely by this export
+                        if pool is None:
+                            start_pool()
+                        future = pool.submit(speech.synthesize_timed_in_worker, segment)
+                    else:
+                        refill()
+                        _, future = pending.popleft()
+                    audio = synthesized(future)
+                    stats["synthesized_chars"] += len(segment)
+                    source = "synthesized"
+                    if cache is not None:
+                        cache.put(segment, audio)
+                clips.append(audio)
+            if clips:
+                writer.write(entry, PcmAudio.concat(clips), source)
+
+        if pool is not None:
+            stats["wall_seconds"] = time.perf_counter() - started
+    finally:
+        writer.close()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    stats["audio_seconds"] = writer.duration
+    wall = stats["wall_seconds"]
+    task = stats["synthesis_task_seconds"]
+    stats["chars_per_second"] = stats["synthesized_chars"] / wall if wall else None
+    stats["chars_per_second_per_worker"] = stats["chars_per_second"] / workers if wall else None
+    # How many voices were busy on average, against the workers available
+    stats["speedup"] = task / wall if wall else None
+    stats["parallel_efficiency"] = task / wall / workers if wall else None
+    return stats
+
+
+def print_stats(stats, output):
+    print(f"Exported {stats['messages']} messages ({stats['audio_seconds']:.1f}s of audio) to {output}")
+    print(f"Index: {index_path(output)}")
+    print(f"  {stats['from_history']} from history, {stats['cached_chars']} characters from the speech cache")
+    if stats["synthesized_chars"]:
+        print(f"  synthesized {stats['synthesized_chars']} characters in {stats['wall_seconds']:.2f}s "
+              f"on {stats['workers']} worker(s): {stats['chars_per_second']:.0f} chars/s, "
+              f"{stats['chars_per_second_per_worker']:.0f} chars/s per worker")
+        print(f"  {stats['speedup']:.2f}x speedup over one voice, "
+              f"{stats['parallel_efficiency'] * 100:.0f}% parallel efficiency")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export a receiver session to one audio file and index")
+    parser.add_argument("source", type=Path, nargs="?",
+                        help="history session directory, index.jsonl, JSON-lines or text transcript "
+                             "(default: the latest history session)")
+    parser.add_argument("--output", type=Path,
+                        help=f"WAV file to write (default: {EXPORT_FILE} in the session directory, "
+                             "or next to the transcript)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="synthesis processes")
+    parser.add_argument("--gap", type=float, default=GAP_SECONDS, help="seconds of silence between messages")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the speech cache")
+    parser.add_argument("--resynthesize", action="store_true", help="ignore the history's audio")
+    return parser.parse_args()
+
+
+def main_cli():
+    # The receiver's voice, synthesis parameters and cache location
+    import main
+    from tts_cache import SpeechCache, model_fingerprint
+
+    args = parse_args()
+    source = args.source
+    if source is None:
+        sessions = sorted(path for path in main.HISTORY_DIR.glob("*") if (path / INDEX_FILE).exists())
+        if not sessions:
+            print(f"No history sessions in {main.HISTORY_DIR}")
+            return 1
+        source = sessions[-1]
+
+    with load_transcript(source) as entries:
+        if not entries:
+            print(f"No messages in {source}")
+            return 1
+        if args.resynthesize:
+            entries = [dict(entry, audio=None) for entry in entries]
+
+        output = args.output
+        if output is None:
+            if source.is_dir():
+                output = source / EXPORT_FILE
+            elif source.name == INDEX_FILE:
+                output = source.parent / EXPORT_FILE
+            else:
+                output = source.with_suffix(".wav")
+
+        cache = None
+        if not args.no_cache:
+            cache = SpeechCache(main.TTS_CACHE_DIR, lambda: model_fingerprint(main.TTS_MODEL, main.TTS_CONFIG),
+                                params=main.SYNTHESIS_PARAMS)
+
+        stats = export_session(entries, output, main.TTS_MODEL, main.SYNTHESIS_PARAMS,
+                               workers=args.workers, cache=cache, gap=args.gap)
+        print_stats(stats, output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,206 @@
+"""
+BLE message framing for the Memento Cognitio receiver.
+
+Notifications are reassembled as bytes and only decoded once a whole message
+is available, so multibyte characters split across packets survive. Two wire
+formats are understood and may be mixed on one link:
+
+* legacy: UTF-8 text terminated by "\\n"
+* framed: STX, flags, message id, payload length, then the UTF-8 payload.
+  Framed messages may contain newlines and are dispatched as soon as the
+  declared length has arrived. A streamed response arrives as several
+  frames sharing one message id, all but the last flagged partial.
+  Long payloads may be raw DEFLATE once the receiver has announced that it
+  can inflate them with a capabilities frame written back to the camera.
+
+A frame the camera gave up on halfway is not trusted to its declared
+length: an unfinished message is dropped once no bytes have arrived for
+STALL_TIMEOUT, and a frame whose length is implausible, or whose text
+contains the start of another frame, is cut off there so parsing picks up
+at the next STX.
+
+The firmware side lives in firmware/manager/framing.py; keep the two in sync.
+"""
+
+import time
+import zlib
+import struct
+
+
+FRAME_START = 0x02
+# start byte, flags, message id, payload length
+FRAME_HEADER = struct.Struct(">BBHH")
+# Payload is a JSON capture trace for the message with the same id
+FRAME_FLAG_TRACE = 0x01
+# More parts of this message id follow; the last part clears the flag
+FRAME_FLAG_PARTIAL = 0x02
+# Payload is raw DEFLATE
+FRAME_FLAG_DEFLATE = 0x04
+# Receiver to camera: the payload's first byte is the flags the receiver decodes
+FRAME_FLAG_CAPABILITIES = 0x08
+FRAME_FLAGS_KNOWN = FRAME_FLAG_TRACE | FRAME_FLAG_PARTIAL | FRAME_FLAG_DEFLATE
+# The camera's longest payloads (long answers, capture traces) are a few kB
+MAX_FRAME_PAYLOAD = 16 * 1024
+# The camera sends each message's notifications back to back; a message
+# still unfinished after this many idle seconds never will be
+STALL_TIMEOUT = 1.0
+
+
+def encode_frame(message_id, text, flags=0):
+    payload = text.encode("utf-8")
+    if flags & FRAME_FLAG_DEFLATE:
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+        payload = compressor.compress(payload) + compressor.flush()
+    return FRAME_HEADER.pack(FRAME_START, flags, message_id & 0xFFFF, len(payload)) + payload
+
+
+def inflate(payload):
+    """Inflate a raw DEFLATE payload that must be exactly one whole stream"""
+    decompressor = zlib.decompressobj(-15)
+    inflated = decompressor.decompress(payload)
+    if not decompressor.eof or decompressor.unused_data:
+        # Cut short, or run into the bytes of the next frame
+        raise zlib.error("payload is not one complete DEFLATE stream")
+    return inflated
+
+
+def encode_capabilities(flags=FRAME_FLAGS_KNOWN):
+    """The frame announcing which flags this receiver decodes"""
+    return FRAME_HEADER.pack(FRAME_START, FRAME_FLAG_CAPABILITIES, 0, 1) + bytes([flags])
+
+
+class FramedMessage:
+    """One reassembled message and when its bytes arrived"""
+
+    def __init__(self, message_id, text, flags, first_byte_at):
+        self.message_id = message_id
+        self.text = text
+        self.flags = flags
+        self.first_byte_at = first_byte_at
+        self.completed_at = time.monotonic()
+
+    @property
+    def is_trace(self):
+        return bool(self.flags & FRAME_FLAG_TRACE)
+
+    @property
+    def is_partial(self):
+        return bool(self.flags & FRAME_FLAG_PARTIAL)
+
+
+class MessageFramer:
+    """Incremental byte-level reassembly of BLE notifications"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.messages = 0
+        self.frames = 0
+        self.discarded = 0
+        # Payload bytes received in compressed frames, and after inflating them
+        self.compressed_bytes = 0
+        self.inflated_bytes = 0
+        # Bytes of a legacy message already searched for a newline
+        self._scanned = 0
+        # When the first byte of the message at the head of the buffer arrived
+        self._first_byte_at = None
+        self._last_byte_at = None
+
+    def feed(self, data):
+        """Add one notification; returns the FramedMessages it completed"""
+        now = time.monotonic()
+        if self.buffer and now - self._last_byte_at > STALL_TIMEOUT:
+            self.discarded += 1
+            print(f"Discarding {len(self.buffer)} bytes of a message that stopped arriving")
+            self.reset()
+        if not self.buffer:
+            self._first_byte_at = now
+        self._last_byte_at = now
+        self.buffer += data
+        completed = []
+
+        while self.buffer:
+            if self.buffer[0] == FRAME_START:
+                message = self._take_frame()
+            else:
+                message = self._take_line()
+            # None: incomplete, wait for more bytes; False: frame discarded
+            if message is None:
+                break
+            if message is not False:
+                completed.append(message)
+            # Anything left over arrived in this notification
+            self._first_byte_at = time.monotonic()
+
+        return completed
+
+    def _take_frame(self):
+        if len(self.buffer) < FRAME_HEADER.size:
+            return None
+
+        _, flags, message_id, length = FRAME_HEADER.unpack_from(self.buffer)
+        if length > MAX_FRAME_PAYLOAD:
+            return self._resync(f"frame #{message_id} claiming {length} bytes")
+
+        end = FRAME_HEADER.size + length
+        if not flags & FRAME_FLAG_DEFLATE:
+            # Text and traces never contain STX; one in the payload is the
+            # next frame, after a frame the camera did not finish
+            start = self.buffer.find(bytes([FRAME_START]), FRAME_HEADER.size, end)
+            if start >= 0:
+                return self._resync(f"unfinished frame #{message_id}", start)
+        if len(self.buffer) < end:
+            return None
+
+        header = bytes(self.buffer[:FRAME_HEADER.size])
+        payload = bytes(self.buffer[FRAME_HEADER.size:end])
+        del self.buffer[:end]
+        self.frames += 1
+
+        if flags & ~FRAME_FLAGS_KNOWN:
+            self.discarded += 1
+            print(f"Discarding frame #{message_id} with unsupported flags 0x{flags:02x}")
+            return False
+
+        if flags & FRAME_FLAG_DEFLATE:
+            try:
+                inflated = inflate(payload)
+            except zlib.error as e:
+                # Its declared length is as suspect as its payload
+                self.buffer[:0] = header + payload
+                return self._resync(f"frame #{message_id} that does not inflate ({e})")
+            self.compressed_bytes += len(payload)
+            self.inflated_bytes += len(inflated)
+            payload = inflated
+
+        self.messages += 1
+        return FramedMessage(message_id, payload.decode("utf-8", "replace"), flags, self._first_byte_at)
+
+    def _resync(self, what, start=None):
+        """Drop the frame at the head of the buffer up to the next STX"""
+        if start is None:
+            start = self.buffer.find(bytes([FRAME_START]), 1)
+        if start < 0:
+            start = len(self.buffer)
+        del self.buffer[:start]
+        self.discarded += 1
+        print(f"Discarding {what}: skipped {start} bytes to the next frame")
+        return False
+
+    def _take_line(self):
+        end = self.buffer.find(b"\n", self._scanned)
+        if end < 0:
+            self._scanned = len(self.buffer)
+            return None
+
+        payload = bytes(self.buffer[:end])
+        del self.buffer[:end + 1]
+        self._scanned = 0
+        self.messages += 1
+        return FramedMessage(None, payload.decode("utf-8", "replace"), 0, self._first_byte_at)
+
+    def reset(self):
+        """Forget any partial message, e.g. after a disconnect"""
+        self.buffer.clear()
+        self._scanned = 0
+        self._first_byte_at = None
+        self._last_byte_at = None
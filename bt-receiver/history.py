@@ -0,0 +1,146 @@
+"""
+Bounded audio history for the Memento Cognitio receiver.
+
+The newest entries keep their PCM in a fixed-size in-memory ring. When an
+entry falls out of the ring its PCM is appended to a per-session raw PCM file
+and a line is added to a JSON-lines index, so old messages can be replayed
+through a memory map without loading the whole session.
+"""
+
+import json
+import mmap
+import time
+import datetime
+import collections
+from pathlib import Path
+
+from speech import PcmAudio
+
+
+HISTORY_MEMORY_ENTRIES = 20
+
+AUDIO_FILE = "audio.pcm"
+INDEX_FILE = "index.jsonl"
+
+
+class AudioHistory:
+    """Ring of recent clips backed by an append-only PCM file"""
+
+    def __init__(self, directory, capacity=HISTORY_MEMORY_ENTRIES, session=None):
+        session = session or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.directory = Path(directory) / session
+        self.capacity = max(1, capacity)
+
+        self._index = []
+        self._recent = collections.deque()
+        self._audio_file = None
+        self._index_file = None
+        self._map = None
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        for i in range(len(self._index)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        meta = self._index[i]
+        return {
+            "timestamp": meta["timestamp"],
+            "message": meta["message"],
+            "audio": self.audio(i),
+        }
+
+    @property
+    def audio_path(self):
+        return self.directory / AUDIO_FILE
+
+    @property
+    def index_path(self):
+        return self.directory / INDEX_FILE
+
+    def entries(self):
+        """Index records for every message, without audio"""
+        return list(self._index)
+
+    def append(self, timestamp, message, audio, complete=True):
+        """Add a spoken message; complete is False if its audio was cut short"""
+        meta = {
+            "seq": len(self._index) + 1,
+            "time": time.time(),
+            "timestamp": timestamp,
+            "message": message,
+            "offset": None,
+            "length": len(audio.pcm),
+            "sample_rate": audio.sample_rate,
+            "sample_width": audio.sample_width,
+            "channels": audio.channels,
+            "complete": complete,
+        }
+        self._index.append(meta)
+        self._recent.append((meta, audio))
+
+        while len(self._recent) > self.capacity:
+            self._spill(*self._recent.popleft())
+
+        return meta
+
+    def audio(self, i):
+        """PCM for entry i, from the ring or the memory-mapped session file"""
+        meta = self._index[i]
+        if meta["offset"] is None:
+            for recent_meta, audio in self._recent:
+                if recent_meta is meta:
+                    return audio
+
+        start = meta["offset"]
+        end = start + meta["length"]
+        pcm = self._mapped(end)[start:end]
+        return PcmAudio(pcm, meta["sample_rate"], meta["sample_width"], meta["channels"])
+
+    def _open(self):
+        if self._audio_file is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._audio_file = open(self.audio_path, "ab")
+            self._index_file = open(self.index_path, "a", encoding="utf-8")
+
+    def _spill(self, meta, audio):
+        self._open()
+        meta["offset"] = self._audio_file.tell()
+        self._audio_file.write(audio.pcm)
+        self._audio_file.flush()
+        self._index_file.write(json.dumps(meta) + "\n")
+        self._index_file.flush()
+
+    def _mapped(self, end):
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            with open(self.audio_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def close(self):
+        """Spill the ring so the whole session is on disk, then release files"""
+        while self._recent:
+            self._spill(*self._recent.popleft())
+
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._audio_file is not None:
+            self._audio_file.close()
+            self._index_file.close()
+            self._audio_file = None
+            self._index_file = None
+
+
+def load_session(directory):
+    """Read a closed session's index records from disk"""
+    records = []
+    with open(Path(directory) / INDEX_FILE, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
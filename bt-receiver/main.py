@@ -11,16 +11,24 @@ in the Software without restriction.
 Project: Memento Cognitio – AI-powered visual cognition device
 """
 
-import io
-import wave
+import json
+import time
 import asyncio
 import datetime
+import functools
+import contextlib
 from pathlib import Path
-from pydub import playback
-from piper import PiperVoice
-from pydub import AudioSegment 
 from bleak import BleakScanner, BleakClient
 
+import speech
+import export
+from framing import MessageFramer, encode_capabilities
+from audio_sink import create_sink
+from pipeline import SpeechPipeline
+from tts_cache import SpeechCache, model_fingerprint
+from history import AudioHistory, HISTORY_MEMORY_ENTRIES
+from tracing import CaptureTracer, print_summary, percentile
+
 
 UART_SERVICE_UUID = "6E400001-B5A3-F393-E0A9-E50E24DCCA9E"
 UART_RX_CHAR_UUID = "6E400003-B5A3-F393-E0A9-E50E24DCCA9E"  
@@ -28,139 +36,566 @@ UART_TX_CHAR_UUID = "6E400002-B5A3-F393-E0A9-E50E24DCCA9E"
 
 DEVICE_NAME = "Memento-Cam"
 SCAN_TIMEOUT = 10.0
+# Every camera advertising DEVICE_NAME is connected, up to MAX_CAMERAS at
+# once; while any is connected the receiver scans for more this often
+MAX_CAMERAS = 4
+RESCAN_INTERVAL = 15.0
+# After a dropout the receiver connects straight to the camera it knows,
+# waiting RECONNECT_MIN_DELAY doubling up to RECONNECT_MAX_DELAY between
+# attempts, and only goes back to scanning after RECONNECT_ATTEMPTS failures
+CONNECT_TIMEOUT = 5.0
+RECONNECT_ATTEMPTS = 4
+RECONNECT_MIN_DELAY = 0.5
+RECONNECT_MAX_DELAY = 8.0
 
 BASE_DIR = Path(__file__).parent.resolve()
 TTS_MODEL = BASE_DIR / "tts_models" / "en_US-libritts_r-medium.onnx"
-TTS_VOICE = PiperVoice.load(TTS_MODEL)
+TTS_CONFIG = TTS_MODEL.with_suffix(".onnx.json")
+# Keyword arguments for piper.SynthesisConfig, e.g. {"length_scale": 0.9}
+SYNTHESIS_PARAMS = {}
+# Loaded in the background while the receiver scans for the camera
+TTS_VOICE = speech.VoiceLoader(TTS_MODEL, SYNTHESIS_PARAMS)
+
+TTS_CACHE_DIR = BASE_DIR / "tts_cache"
+USE_SPEECH_CACHE = True
+
+HISTORY_DIR = BASE_DIR / "history"
+# On exit, write the session to history/<session>/session.wav with a seek
+# index, synthesizing anything cut short again on EXPORT_WORKERS processes
+# (None: one per core). export.py does the same for any saved session.
+EXPORT_ON_EXIT = False
+EXPORT_WORKERS = None
+
+# Addresses of cameras connected before, tried first on the next start
+KNOWN_CAMERAS_FILE = BASE_DIR / "known_cameras.json"
+
+# One JSON line per capture joining firmware and receiver stage timings
+TRACE_CAPTURES = True
+TRACE_DIR = BASE_DIR / "traces"
+
+# "auto" keeps one sounddevice stream open (pydub if unavailable);
+# "stream", "pydub", "file" (writes AUDIO_SINK_FILE) and "null" force a sink.
+AUDIO_SINK = "auto"
+AUDIO_SINK_FILE = BASE_DIR / "receiver-output.wav"
+_audio_output = None
+
+# "thread" shares TTS_VOICE and synthesizes one message at a time while the
+# previous one plays; "process" loads a voice per worker and scales with cores.
+SYNTHESIS_EXECUTOR = "thread"
+SYNTHESIS_WORKERS = 1
+MAX_PENDING_MESSAGES = 8
+# Speak each sentence as soon as it is synthesized instead of the whole message
+STREAM_SENTENCES = True
+# A new capture from a camera cuts off what that camera's last one is saying
+# and discards its unspoken backlog; playback stops within
+# INTERRUPT_SLICE_SECONDS (gapless sinks only). Framed messages only: without
+# framing a streamed answer arrives as one line per sentence
+BARGE_IN = True
+INTERRUPT_SLICE_SECONDS = 0.25
+# Messages closer together than this came from one burst (the camera's
+# offline backlog) rather than a new press, and queue up instead
+BARGE_IN_MIN_GAP = 0.5
+# Messages that waited longer than MAX_MESSAGE_AGE seconds (0 never) are
+# "drop"ped or "shorten"ed to their first sentence
+MAX_MESSAGE_AGE = 20.0
+STALE_MESSAGES = "shorten"
+
+
+def synthesize_speech(text):
+    return TTS_VOICE.synthesize(text)
+
+
+def warm_up_speech():
+    return TTS_VOICE.warm_up()
+
+
+def log_phase(name, started):
+    print(f"[startup] {name}: {time.perf_counter() - started:.2f}s")
+
+
+def audio_output():
+    """The process-wide audio sink, opened on first use"""
+    global _audio_output
+    if _audio_output is None:
+        _audio_output = create_sink(AUDIO_SINK, AUDIO_SINK_FILE)
+        print(f"Audio output: {_audio_output.name}")
+    return _audio_output
+
+
+def play_audio(audio):
+    audio_output().write(audio)
 
 
 def convert_to_speech(text, play=True):
     if not text:
         return None
     
-    wav_buffer = io.BytesIO()
-    
-    with wave.open(wav_buffer, "wb") as wav_file:
-        TTS_VOICE.synthesize_wav(text, wav_file)
-    
-    wav_buffer.seek(0)
+    audio = synthesize_speech(text)
     
     if play:
-        audio_segment = AudioSegment.from_file(wav_buffer, format="wav")
-        playback.play(audio_segment)
+        play_audio(audio)
     
-    return wav_buffer
+    return audio.to_wav()
 
-class MementoReceiver:
-    def __init__(self):
+class CameraLink:
+    """A camera the receiver has seen and the framing state of its notifications"""
+    
+    def __init__(self, device):
+        # A BLEDevice from a scan, or just the address of a known camera
+        self.device = device
+        self.address = getattr(device, "address", device)
+        # Short enough to tag every message with
+        self.label = self.address.replace(":", "")[-4:]
         self.client = None
-        self.message_buffer = ""
+        self.framer = MessageFramer()
+        self.stream_parts = {}
         self.message_count = 0
-        self.audio_history = []
+        self.last_message_at = None
+        self.connections = 0
+        # When the last connection dropped, and (seconds, "direct" or "scan")
+        # for every reconnect since the receiver started
+        self.lost_at = None
+        self.reconnects = []
     
-    async def find_device(self):
-        print(f"Scanning for '{DEVICE_NAME}'...")
-        print("Make sure your Memento camera is powered on!\n")
+    @property
+    def connected(self):
+        return self.client is not None and self.client.is_connected
+    
+    def reset(self, client):
+        self.client = client
+        self.framer.reset()
+        self.stream_parts.clear()
+        self.connections += 1
+
+
+class MementoReceiver:
+    def __init__(
+        self,
+        workers=SYNTHESIS_WORKERS,
+        executor=SYNTHESIS_EXECUTOR,
+        max_pending=MAX_PENDING_MESSAGES,
+        stream=STREAM_SENTENCES,
+        barge_in=BARGE_IN,
+        max_age=MAX_MESSAGE_AGE,
+        stale=STALE_MESSAGES,
+        use_cache=USE_SPEECH_CACHE,
+        history_entries=HISTORY_MEMORY_ENTRIES,
+        history_dir=HISTORY_DIR,
+        known_cameras=KNOWN_CAMERAS_FILE,
+        trace=TRACE_CAPTURES,
+        sink=None,
+        scanner=BleakScanner,
+        client_class=BleakClient
+    ):
+        self.scanner = scanner
+        self.client_class = client_class
+        # Every camera seen, by address, and the tasks of those connected
+        self.cameras = {}
+        self._connections = {}
+        # Scans and connection attempts share the adapter one at a time; a
+        # connection attempt ends the scan in progress rather than wait it out
+        self._radio = asyncio.Lock()
+        self._stop_scan = asyncio.Event()
+        self.known_cameras = known_cameras
+        self.barge_in = barge_in
+        self.message_count = 0
+        self.audio_history = AudioHistory(history_dir, capacity=history_entries)
+        self.tracer = CaptureTracer(TRACE_DIR) if trace else None
+        self._startup_report = None
+        
+        if executor == "process":
+            synthesize, warm_up, warm_up_runs = speech.synthesize_in_worker, speech.warm_up_worker, workers
+            initializer, initargs = speech.init_worker, (str(TTS_MODEL), SYNTHESIS_PARAMS)
+        else:
+            synthesize, warm_up, warm_up_runs = synthesize_speech, warm_up_speech, 1
+            initializer, initargs = None, ()
+        
+        self.cache = None
+        if use_cache:
+            self.cache = SpeechCache(
+                TTS_CACHE_DIR,
+                lambda: model_fingerprint(TTS_MODEL, TTS_CONFIG),
+                params=SYNTHESIS_PARAMS
+            )
         
-        device = await BleakScanner.find_device_by_name(
-            DEVICE_NAME, 
-            timeout=SCAN_TIMEOUT
+        self.sink = sink or audio_output()
+        slice_seconds = INTERRUPT_SLICE_SECONDS if barge_in and self.sink.gapless else 0.0
+        self.speech = SpeechPipeline(
+            synthesize,
+            self.sink.write,
+            workers=workers,
+            executor=executor,
+            max_pending=max_pending,
+            initializer=initializer,
+            initargs=initargs,
+            on_played=self.message_played,
+            stream=stream,
+            cache=self.cache,
+            warm_up=warm_up,
+            warm_up_runs=warm_up_runs,
+            max_age=max_age,
+            stale=stale,
+            slice_seconds=slice_seconds
         )
+    
+    async def find_devices(self):
+        """Scan for cameras advertising DEVICE_NAME and watch each new one.
         
-        if device:
-            print(f"Found device: {device.name}")
+        A camera is handed to its connection task as soon as it is seen, and
+        the scan ends as soon as any camera needs the radio to connect;
+        otherwise it ends after SCAN_TIMEOUT. Returns how many new cameras
+        were found.
+        """
+        found = 0
+        
+        def detected(device, advertisement):
+            nonlocal found
+            if (advertisement.local_name or device.name) != DEVICE_NAME:
+                return
+            if device.address in self._connections:
+                # Still being tried directly; the next attempt can use this
+                if not self.cameras[device.address].connected:
+                    self.camera(device)
+                return
+            if len(self._connections) >= MAX_CAMERAS:
+                return
+            print(f"Found device: {DEVICE_NAME}")
             print(f"  Address: {device.address}\n")
-            return device
-        else:
-            print(f"Device '{DEVICE_NAME}' not found after {SCAN_TIMEOUT}s")
-            print("\nTroubleshooting:")
-            print("  1. Check if the camera is powered on")
-            print("  2. Make sure Bluetooth is enabled on your laptop")
-            print("  3. Try moving the camera closer")
-            print("  4. Restart the camera and try again")
-            return None
-    
-    def handle_notification(self, sender, data):
-        """Handle incoming BLE notifications"""
+            # Each camera is held by its own task; one that cannot be
+            # reconnected directly is found again by a later scan
+            self.watch(device, "scan")
+            found += 1
+        
+        async with self._radio:
+            self._stop_scan.clear()
+            async with self.scanner(detection_callback=detected):
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._stop_scan.wait(), SCAN_TIMEOUT)
+        return found
+    
+    def print_not_found(self):
+        print(f"Device '{DEVICE_NAME}' not found after {SCAN_TIMEOUT}s")
+        print("\nTroubleshooting:")
+        print("  1. Check if the camera is powered on")
+        print("  2. Make sure Bluetooth is enabled on your laptop")
+        print("  3. Try moving the camera closer")
+        print("  4. Restart the camera and try again")
+    
+    def camera(self, device):
+        address = getattr(device, "address", device)
+        camera = self.cameras.get(address)
+        if camera is None:
+            camera = self.cameras[address] = CameraLink(device)
+        elif not isinstance(device, str):
+            # A fresh scan result; connects without looking the address up
+            camera.device = device
+        return camera
+    
+    def load_known_cameras(self):
+        if not self.known_cameras:
+            return []
         try:
-            text = data.decode('utf-8')
-            self.message_buffer += text
-            
-            if '\n' in self.message_buffer:
-                messages = self.message_buffer.split('\n')
+            return json.loads(Path(self.known_cameras).read_text())
+        except (OSError, ValueError):
+            return []
+    
+    def save_known_camera(self, camera):
+        if not self.known_cameras:
+            return
+        addresses = [address for address in self.load_known_cameras() if address != camera.address]
+        addresses.insert(0, camera.address)
+        try:
+            Path(self.known_cameras).write_text(json.dumps(addresses[:MAX_CAMERAS]))
+        except OSError as e:
+            print(f"Could not save known cameras: {e}")
+    
+    def forget_known_camera(self, camera):
+        """Stop trying a camera directly on start; a scan that finds it adds it back"""
+        if not self.known_cameras:
+            return
+        addresses = self.load_known_cameras()
+        if camera.address not in addresses:
+            return
+        addresses.remove(camera.address)
+        try:
+            Path(self.known_cameras).write_text(json.dumps(addresses))
+        except OSError as e:
+            print(f"Could not save known cameras: {e}")
+    
+    def handle_notification(self, camera, sender, data):
+        """Handle incoming BLE notifications from one camera"""
+        try:
+            for message in camera.framer.feed(data):
+                if message.is_trace:
+                    if self.tracer:
+                        self.tracer.add_firmware_trace(message.message_id, message.text, camera.address)
+                    continue
+                
+                # Streamed responses arrive as numbered parts of one message
+                part = camera.stream_parts.pop(message.message_id, 0) + 1
+                if message.is_partial:
+                    camera.stream_parts[message.message_id] = part
+                
+                msg = message.text.strip()
+                if not msg:
+                    continue
+                
+                barge_in = False
+                if part == 1:
+                    self.message_count += 1
+                    camera.message_count += 1
+                    # A legacy line may be the next sentence of the same
+                    # answer, so only a framed message starts a new capture
+                    barge_in = self.barge_in and message.message_id is not None and (
+                        camera.last_message_at is None or
+                        message.completed_at - camera.last_message_at >= BARGE_IN_MIN_GAP)
+                camera.last_message_at = message.completed_at
+                timestamp = datetime.datetime.now().strftime("%H:%M:%S")
+                tag = f" | cam {camera.label}"
+                if message.message_id is not None:
+                    tag += f" | id {message.message_id}"
+                if message.is_partial or part > 1:
+                    tag += f" | part {part}"
                 
-                for msg in messages[:-1]:
-                    if msg.strip():
-                        self.message_count += 1
-                        timestamp = datetime.datetime.now().strftime("%H:%M:%S")
-                        
-                        print("=" * 60)
-                        print(f"Message #{self.message_count} | {timestamp}")
-                        print("-" * 60)
-                        print(msg.strip())
-                        print("=" * 60)
-                        print()
-                        
-                        audio_buffer = convert_to_speech(msg.strip(), play=True)
-                        self.audio_history.append({
-                            'timestamp': timestamp,
-                            'message': msg.strip(),
-                            'audio': audio_buffer
-                        })
+                print("=" * 60)
+                print(f"Message #{self.message_count} | {timestamp}{tag}")
+                print("-" * 60)
+                print(msg)
+                print("=" * 60)
+                print()
                 
-                self.message_buffer = messages[-1]
+                self.speech.submit(msg, timestamp, meta={
+                    "camera": camera.address,
+                    "message_id": message.message_id,
+                    "part": part,
+                    "first_byte_at": message.first_byte_at,
+                    "completed_at": message.completed_at
+                }, source=camera.address, continuation=part > 1, barge_in=barge_in)
                 
         except Exception as e:
             print(f"Error processing notification: {e}")
     
-    async def connect_and_listen(self, device):
-        """Connect to device and listen for messages"""
-        print("Connecting to Memento camera...")
+    def message_played(self, job):
+        """Pipeline callback once a message has been spoken"""
+        self.record_history(job)
+        if self.tracer:
+            self.tracer.record(job)
+    
+    def record_history(self, job):
+        """Keep a copy of every message once it has been spoken"""
+        self.audio_history.append(job.timestamp, job.text, job.audio, complete=job.complete)
+    
+    def export_history(self, output=None, workers=EXPORT_WORKERS):
+        """Write every spoken message so far to one WAV file with a seek index"""
+        output = output or self.audio_history.directory / export.EXPORT_FILE
+        stats = export.export_session(export.history_entries(self.audio_history), output,
+                                      TTS_MODEL, SYNTHESIS_PARAMS, workers=workers, cache=self.cache)
+        export.print_stats(stats, output)
+        return stats
+    
+    async def replay(self, index=-1):
+        """Play a message from the history again"""
+        audio = self.audio_history.audio(index)
+        await asyncio.to_thread(self.sink.write, audio)
+    
+    async def connect_and_listen(self, device, how="scan"):
+        """Connect to device and listen for messages until it disconnects.
+        
+        Returns whether the connection was made.
+        """
+        camera = self.camera(device)
+        print(f"Connecting to Memento camera {camera.label}...")
+        connected = False
+        lost = asyncio.Event()
         
         try:
-            async with BleakClient(device) as client:
-                self.client = client
-                print(f"Connected successfully!\n")
+            started = time.perf_counter()
+            async with contextlib.AsyncExitStack() as stack:
+                self._stop_scan.set()
+                async with self._radio:
+                    client = await stack.enter_async_context(self.client_class(
+                        camera.device,
+                        disconnected_callback=lambda _: lost.set(),
+                        timeout=CONNECT_TIMEOUT
+                    ))
+                connected = True
+                camera.reset(client)
+                print(f"Connected successfully to {camera.label}!\n")
+                self.save_known_camera(camera)
+                if camera.lost_at is not None:
+                    seconds = time.monotonic() - camera.lost_at
+                    camera.reconnects.append((seconds, how))
+                    camera.lost_at = None
+                    print(f"[reconnect] camera {camera.label}: {seconds:.2f}s ({how})")
                 
                 await client.start_notify(
                     UART_RX_CHAR_UUID, 
-                    self.handle_notification
+                    functools.partial(self.handle_notification, camera)
                 )
+                # Tell the camera which frame encodings it may use
+                try:
+                    await client.write_gatt_char(UART_TX_CHAR_UUID, encode_capabilities())
+                except Exception as e:
+                    print(f"Could not send capabilities to the camera: {e}")
+                if sum(known.connections for known in self.cameras.values()) == 1:
+                    # Reconnects are logged as [reconnect] above
+                    log_phase("connect", started)
                 
                 print("Listening for messages from camera...")
                 print("Press Ctrl+C to stop\n")
                 
-                while True:
-                    if not client.is_connected:
-                        print("\n✗ Connection lost!")
-                        break
-                    await asyncio.sleep(1)
+                while client.is_connected and not lost.is_set():
+                    # The callback reports a dropout at once; polling is the fallback
+                    with contextlib.suppress(asyncio.TimeoutError):
+                        await asyncio.wait_for(lost.wait(), 1)
+                print(f"\n✗ Connection to {camera.label} lost!")
                     
         except Exception as e:
-            print(f"\n✗ Connection error: {e}")
+            print(f"\n✗ Connection error ({camera.label}): {e}")
         finally:
-            print("\nDisconnected from camera")
+            if connected:
+                camera.lost_at = time.monotonic()
+            camera.client = None
+            print(f"\nDisconnected from camera {camera.label}")
+        return connected
+    
+    async def keep_connected(self, device, how="scan"):
+        """Hold a connection to one camera, reconnecting straight to it.
+        
+        After a dropout the camera is reconnected from its known device or
+        address without scanning, with exponential backoff between attempts.
+        After RECONNECT_ATTEMPTS failures in a row it is left to the scan loop
+        and dropped from the known cameras.
+        """
+        camera = self.camera(device)
+        try:
+            failures = 0
+            delay = RECONNECT_MIN_DELAY
+            while True:
+                if await self.connect_and_listen(camera.device, how):
+                    failures = 0
+                    delay = RECONNECT_MIN_DELAY
+                else:
+                    failures += 1
+                    if failures >= RECONNECT_ATTEMPTS:
+                        print(f"Camera {camera.label} not reachable directly, scanning for it instead")
+                        self.forget_known_camera(camera)
+                        break
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                how = "direct"
+        finally:
+            self._connections.pop(camera.address, None)
+    
+    def reconnect_stats(self):
+        """Dropout-to-reconnected times over all cameras"""
+        reconnects = [reconnect for camera in self.cameras.values() for reconnect in camera.reconnects]
+        seconds = [reconnect[0] for reconnect in reconnects]
+        return {
+            "count": len(reconnects),
+            "direct": sum(1 for reconnect in reconnects if reconnect[1] == "direct"),
+            "scan": sum(1 for reconnect in reconnects if reconnect[1] == "scan"),
+            "p50": percentile(seconds, 0.5),
+            "p95": percentile(seconds, 0.95),
+            "max": max(seconds) if seconds else None,
+        }
+    
+    def watch(self, device, how):
+        camera = self.camera(device)
+        self._connections[camera.address] = asyncio.create_task(self.keep_connected(device, how))
+    
+    def connecting(self):
+        """Whether a camera that dropped out is being reconnected.
+        
+        Known cameras not seen since the start do not count, so one that is
+        away does not hold up scanning for the others.
+        """
+        return any(
+            self.cameras[address].lost_at is not None and not self.cameras[address].connected
+            for address in self._connections
+        )
+    
+    async def report_startup(self, started):
+        """Log total startup time once a camera is connected and the voice is warm"""
+        await self.speech.ready.wait()
+        while not any(camera.connected for camera in self.cameras.values()):
+            await asyncio.sleep(0.1)
+        log_phase("ready", started)
     
     async def run(self):
-        """Main run loop with automatic reconnection"""
+        """Scan for cameras and keep every one found connected"""
         print("=" * 60)
         print("Memento Camera Bluetooth Receiver")
         print("=" * 60)
         print()
         
-        while True:
-            device = await self.find_device()
-            
-            if device:
-                await self.connect_and_listen(device)
+        # The voice loads and warms up on the synthesis pool while we scan
+        started = time.perf_counter()
+        await self.speech.start()
+        self._startup_report = asyncio.create_task(self.report_startup(started))
+        
+        # Cameras from earlier runs are connected to without a scan
+        for address in self.load_known_cameras()[:MAX_CAMERAS]:
+            self.watch(address, "direct")
+        
+        try:
+            while True:
+                if self.connecting():
+                    # Reconnects go first; the radio is left to them
+                    await asyncio.sleep(1)
+                    continue
                 
-                print("\nAttempting to reconnect in 3 seconds...")
-                print("Press Ctrl+C to exit\n")
-                await asyncio.sleep(3)
-            else:
-                print(f"\nRetrying in 3 seconds...")
-                print("Press Ctrl+C to exit\n")
-                await asyncio.sleep(3)
+                if len(self._connections) < MAX_CAMERAS:
+                    if not self._connections:
+                        print(f"Scanning for '{DEVICE_NAME}'...")
+                        print("Make sure your Memento camera is powered on!\n")
+                    scan_started = time.perf_counter()
+                    found = await self.find_devices()
+                    log_phase("scan", scan_started)
+                    if found and len(self._connections) < MAX_CAMERAS:
+                        # Scan on for more once the new camera has connected
+                        continue
+                
+                if self._connections:
+                    await asyncio.sleep(RESCAN_INTERVAL)
+                else:
+                    self.print_not_found()
+                    print(f"\nRetrying in 3 seconds...")
+                    print("Press Ctrl+C to exit\n")
+                    await asyncio.sleep(3)
+        finally:
+            tasks = list(self._connections.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def print_report(receiver):
+    """Session statistics printed on exit"""
+    print(f"Total messages received: {receiver.message_count}")
+    if len(receiver.cameras) > 1:
+        for camera in receiver.cameras.values():
+            print(f"  camera {camera.label}: {camera.message_count} messages, {camera.connections} connection(s)")
+    speech_stats = receiver.speech.stats()
+    if speech_stats["ttfa_avg"] is not None:
+        print(f"Average time to first audio: {speech_stats['ttfa_avg']:.2f}s")
+    if speech_stats["interrupted"] or speech_stats["superseded"] or speech_stats["stale"]:
+        print(f"Speech scheduling: {speech_stats['interrupted']} interrupted, {speech_stats['superseded']} superseded, "
+              f"{speech_stats['stale']} stale, {speech_stats['skipped_chars']} characters never synthesized")
+    if receiver.cache:
+        stats = receiver.cache.stats()
+        print(f"Speech cache: {stats['memory_hits']} memory hits, {stats['disk_hits']} disk hits, {stats['misses']} misses")
+    reconnects = receiver.reconnect_stats()
+    if reconnects["count"]:
+        print(f"Reconnects: {reconnects['count']} ({reconnects['direct']} direct, {reconnects['scan']} after a scan), "
+              f"p50 {reconnects['p50']:.2f}s, p95 {reconnects['p95']:.2f}s, max {reconnects['max']:.2f}s")
+    compressed = sum(camera.framer.compressed_bytes for camera in receiver.cameras.values())
+    if compressed:
+        inflated = sum(camera.framer.inflated_bytes for camera in receiver.cameras.values())
+        print(f"Compressed frames: {compressed} bytes received for {inflated} bytes of text")
+    if receiver.tracer and receiver.tracer.records:
+        print("\nCapture latency by prompt mode:")
+        print_summary(receiver.tracer.records)
 
 
 async def main():
@@ -168,10 +603,23 @@ async def main():
     
     try:
         await receiver.run()
-    except KeyboardInterrupt:
+    finally:
+        # asyncio.run() turns Ctrl+C into cancelling this task, so the
+        # KeyboardInterrupt only surfaces after main() has returned
         print("\n\nExiting...")
-        print(f"Total messages received: {receiver.message_count}")
+        print_report(receiver)
+        if receiver._startup_report:
+            receiver._startup_report.cancel()
+            await asyncio.gather(receiver._startup_report, return_exceptions=True)
+        await receiver.speech.stop()
+        if EXPORT_ON_EXIT and len(receiver.audio_history):
+            receiver.export_history()
+        receiver.audio_history.close()
+        receiver.sink.close()
+        if receiver.tracer:
+            receiver.tracer.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(main())
\ No newline at end of file
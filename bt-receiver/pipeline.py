@@ -0,0 +1,498 @@
+"""
+Staged speech pipeline for the Memento Cognitio receiver.
+
+The BLE callback only submits framed messages. Synthesis runs on a pool of
+workers and playback runs on its own thread, so the asyncio loop that
+services bleak is never blocked by ONNX inference or audio output.
+
+In streaming mode each message is split into sentences and every sentence is
+handed to playback as soon as it is synthesized, so sentence N plays while
+sentence N+1 is still being generated.
+
+Messages from several sources (cameras) share the workers and the speaker.
+Both stages take jobs in start-time fair queueing order: each source's
+messages are spaced one round apart, so sources take turns and a chatty one
+only delays its own backlog.
+
+A new message can barge in: the source's message playing now stops within
+one playback slice and its backlog is discarded before it is synthesized.
+Messages that waited longer than max_age are dropped, or cut down to their
+first sentence, when synthesis or playback reaches them. Synthesis runs at
+most one job per worker ahead of playback, so a backlog is still text when
+it is discarded or found stale, not audio already paid for.
+"""
+
+import time
+import heapq
+import asyncio
+import itertools
+import collections
+import concurrent.futures
+
+from speech import PcmAudio, split_sentences
+
+
+# Number of recent messages the time-to-first-audio averages are taken over
+LATENCY_WINDOW = 100
+
+
+class SpeechJob:
+    """A framed message travelling through the pipeline"""
+
+    def __init__(self, seq, text, timestamp, meta=None, source=None, tag=0, continuation=False):
+        self.seq = seq
+        self.text = text
+        self.timestamp = timestamp
+        self.meta = meta or {}
+        self.source = source
+        # Fair queueing round the job is scheduled in
+        self.tag = tag
+        self.continuation = continuation
+        self.received_at = time.monotonic()
+        self.synthesis_started_at = None
+        self.first_chunk_at = None
+        self.played_at = None
+        self.segments = []
+        self.audio = None
+        self.error = None
+        self.cancelled = False
+        self.interrupted = False
+        self.stale = False
+        # Whether the job holds one of synthesis' slots ahead of playback
+        self.ahead = False
+        # Segments to speak at most; None speaks the whole message
+        self.segment_limit = None
+        self.first_audio_at = None
+        # Synthesized PcmAudio segments in order, terminated by None
+        self.chunks = asyncio.Queue()
+
+    @property
+    def time_to_first_audio(self):
+        if self.first_audio_at is None:
+            return None
+        return self.first_audio_at - self.received_at
+
+    @property
+    def complete(self):
+        """Whether all of the text was spoken"""
+        return not self.interrupted and self.segment_limit is None and self.error is None
+
+    def wants(self, segments):
+        """Whether another segment is wanted after the given number"""
+        if self.cancelled:
+            return False
+        return self.segment_limit is None or segments < self.segment_limit
+
+
+class FairQueue:
+    """Jobs taken lowest fair queueing tag first, then in arrival order"""
+
+    def __init__(self):
+        self._heap = []
+        self._ready = asyncio.Event()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self):
+        return len(self._heap)
+
+    def full(self, maxsize):
+        return len(self._heap) >= maxsize
+
+    def jobs(self):
+        return [entry[2] for entry in self._heap]
+
+    def __contains__(self, job):
+        return any(entry[2] is job for entry in self._heap)
+
+    def put_nowait(self, job):
+        heapq.heappush(self._heap, (job.tag, job.seq, job))
+        self._unfinished += 1
+        self._finished.clear()
+        self._ready.set()
+
+    def get_nowait(self):
+        return heapq.heappop(self._heap)[2]
+
+    async def get(self):
+        while not self._heap:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.get_nowait()
+
+    def remove(self, job):
+        """Take a job out before it is started; False if it already was"""
+        for i, entry in enumerate(self._heap):
+            if entry[2] is job:
+                self._heap.pop(i)
+                heapq.heapify(self._heap)
+                self.task_done()
+                return True
+        return False
+
+    def task_done(self):
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def join(self):
+        await self._finished.wait()
+
+
+class SpeechPipeline:
+    """Bounded text -> PCM -> speaker pipeline, in order within each source"""
+
+    def __init__(self, synthesize, play, workers=1, executor="thread",
+                 max_pending=8, initializer=None, initargs=(), on_played=None,
+                 stream=True, cache=None, warm_up=None, warm_up_runs=1,
+                 max_age=0.0, stale="shorten", slice_seconds=0.0):
+        self.synthesize = synthesize
+        self.play = play
+        self.stream = stream
+        self.cache = cache
+        self.warm_up = warm_up
+        self.warm_up_runs = warm_up_runs
+        # Workers start taking jobs once the voice is loaded and warmed up;
+        # messages that arrive earlier simply wait in the queues.
+        self.ready = asyncio.Event()
+        self.workers = max(1, workers)
+        self.executor = executor
+        self.max_pending = max(1, max_pending)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.on_played = on_played
+        # Seconds a message may wait before it is stale (0 never), and
+        # whether stale messages are "dropped" or "shorten"ed
+        self.max_age = max_age
+        self.stale_policy = stale
+        # Audio is played in slices this long so it can be interrupted;
+        # 0 plays each segment in one piece
+        self.slice_seconds = slice_seconds
+
+        self.submitted = 0
+        self.dropped = 0
+        self.played = 0
+        self.failed = 0
+        self.interrupted = 0
+        self.superseded = 0
+        self.stale = 0
+        # Characters never synthesized because nobody would hear them
+        self.skipped_chars = 0
+        self.first_audio_latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        # Wall time spent in fresh synthesis and the audio it produced
+        self.synthesis_seconds = 0.0
+        self.synthesized_audio_seconds = 0.0
+
+        self._seq = itertools.count(1)
+        # Tag of the job playing now and of each source's latest job
+        self._round = 0
+        self._last_tag = {}
+        self._playing = None
+        self._tasks = []
+        self._synthesis_executor = None
+        self._playback_executor = None
+        # Every job sits in both queues. Playback holds at most one job it
+        # has already dequeued, so bounding the playback queue also bounds
+        # the synthesis queue and the amount of PCM held in memory.
+        self._synthesis_queue = None
+        self._playback_queue = None
+        # A slot per job synthesized before playback has reached it
+        self._ahead = None
+
+    @property
+    def running(self):
+        return bool(self._tasks)
+
+    async def start(self):
+        """Create the executors and stage tasks"""
+        if self.running:
+            return
+
+        if self.executor == "process":
+            self._synthesis_executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=self.initializer,
+                initargs=self.initargs,
+            )
+        else:
+            self._synthesis_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="tts-synth",
+            )
+        self._playback_executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1,
+            thread_name_prefix="tts-play",
+        )
+
+        self._synthesis_queue = FairQueue()
+        self._playback_queue = FairQueue()
+        self._ahead = asyncio.Queue(maxsize=self.workers)
+
+        self._tasks.append(asyncio.create_task(self._prepare()))
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._synthesis_worker()))
+        self._tasks.append(asyncio.create_task(self._playback_worker()))
+
+        mode = "streaming" if self.stream else "whole-message"
+        print(f"Speech pipeline: {self.workers} {self.executor} worker(s), {self.max_pending} pending max, {mode}")
+
+    async def stop(self):
+        """Cancel the stage tasks and release the executors"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self.ready.clear()
+
+        for executor in (self._synthesis_executor, self._playback_executor):
+            if executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+        self._synthesis_executor = None
+        self._playback_executor = None
+
+    async def drain(self):
+        """Wait until every submitted job has been played or dropped"""
+        if self.running:
+            await self._playback_queue.join()
+
+    def submit(self, text, timestamp=None, meta=None, source=None, continuation=False, barge_in=False):
+        """Queue a message without blocking.
+
+        A continuation (a later part of a streamed response) is scheduled in
+        the same round as the source's previous message, so it plays next
+        instead of waiting for the other sources' turns. A barge-in silences
+        the source's earlier messages first. When the queue is full the
+        oldest pending job of the source with the most is dropped.
+        """
+        if not self.running:
+            raise RuntimeError("Speech pipeline is not running")
+
+        if barge_in:
+            self._barge_in(source)
+        if self._playback_queue.full(self.max_pending):
+            self._drop_oldest()
+
+        if continuation and source in self._last_tag:
+            tag = self._last_tag[source]
+        else:
+            tag = max(self._round, self._last_tag.get(source, 0)) + 1
+        self._last_tag[source] = tag
+
+        job = SpeechJob(next(self._seq), text, timestamp, meta, source, tag, continuation)
+        self._synthesis_queue.put_nowait(job)
+        self._playback_queue.put_nowait(job)
+        self.submitted += 1
+        return job
+
+    def _drop_oldest(self):
+        pending = {}
+        for job in self._playback_queue.jobs():
+            pending.setdefault(job.source, []).append(job)
+        backlog = max(pending.values(), key=len)
+        job = min(backlog, key=lambda job: job.seq)
+
+        self._discard(job)
+        self.dropped += 1
+        print(f"Speech queue full, dropping message #{job.seq}: {job.text[:40]}")
+
+    def _barge_in(self, source):
+        """Stop the source's message playing now and discard its backlog"""
+        for job in self._playback_queue.jobs():
+            if job.source == source:
+                self._discard(job)
+                self.superseded += 1
+                print(f"Message #{job.seq} superseded before it was spoken")
+
+        job = self._playing
+        if job is not None and job.source == source and not job.cancelled:
+            job.cancelled = True
+            job.interrupted = True
+            # Wakes playback if it is waiting for the next segment
+            job.chunks.put_nowait(None)
+            self.interrupted += 1
+            print(f"Message #{job.seq} interrupted by a newer message")
+
+        # The new message starts in the current round, not after the backlog
+        self._last_tag.pop(source, None)
+
+    def _discard(self, job):
+        job.cancelled = True
+        if self._playback_queue.remove(job):
+            self._release(job)
+        if self._synthesis_queue.remove(job):
+            self.skipped_chars += len(job.text)
+
+    def _release(self, job):
+        """Give back the job's slot ahead of playback, if it holds one"""
+        if job.ahead:
+            job.ahead = False
+            self._ahead.get_nowait()
+
+    def _expire(self, job):
+        """Apply the stale message policy once; True if the job is not to be spoken"""
+        if job.stale or job.cancelled or not self.max_age:
+            return job.cancelled
+        age = time.monotonic() - job.received_at
+        if age <= self.max_age:
+            return False
+
+        job.stale = True
+        self.stale += 1
+        # A stale continuation is the middle of an answer; its start is long gone
+        if self.stale_policy == "drop" or job.continuation:
+            job.cancelled = True
+            print(f"Message #{job.seq} waited {age:.1f}s, dropping it")
+        else:
+            job.segment_limit = 1
+            print(f"Message #{job.seq} waited {age:.1f}s, speaking only its first sentence")
+        return job.cancelled
+
+    def stats(self):
+        latencies = self.first_audio_latencies
+        return {
+            "submitted": self.submitted,
+            "played": self.played,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "interrupted": self.interrupted,
+            "superseded": self.superseded,
+            "stale": self.stale,
+            "skipped_chars": self.skipped_chars,
+            "synthesis_queue": self._synthesis_queue.qsize() if self._synthesis_queue else 0,
+            "playback_queue": self._playback_queue.qsize() if self._playback_queue else 0,
+            "ttfa_last": latencies[-1] if latencies else None,
+            "ttfa_avg": sum(latencies) / len(latencies) if latencies else None,
+            "ttfa_max": max(latencies) if latencies else None,
+            "real_time_factor": (self.synthesis_seconds / self.synthesized_audio_seconds
+                                 if self.synthesized_audio_seconds else None),
+        }
+
+    async def _prepare(self):
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        try:
+            if self.cache is not None:
+                await loop.run_in_executor(None, lambda: self.cache.fingerprint)
+            if self.warm_up is not None:
+                timings = await asyncio.gather(*(
+                    loop.run_in_executor(self._synthesis_executor, self.warm_up)
+                    for _ in range(self.warm_up_runs)
+                ))
+                load_seconds, warm_up_seconds = timings[0]
+                print(f"[startup] voice load: {load_seconds:.2f}s, warm-up synthesis: {warm_up_seconds:.2f}s")
+        except Exception as e:
+            print(f"Speech warm-up failed: {e}")
+        finally:
+            print(f"[startup] speech ready: {time.perf_counter() - started:.2f}s")
+            self.ready.set()
+
+    async def _synthesis_worker(self):
+        loop = asyncio.get_running_loop()
+        await self.ready.wait()
+
+        while True:
+            # Wait for playback to catch up before taking the next job, so
+            # it is checked for staleness just before it is synthesized
+            await self._ahead.put(None)
+            job = await self._synthesis_queue.get()
+            # The job playing now does not count as ahead
+            job.ahead = True
+            if job not in self._playback_queue:
+                self._release(job)
+            try:
+                if self._expire(job):
+                    self.skipped_chars += len(job.text)
+                    self._release(job)
+                    continue
+
+                job.synthesis_started_at = time.monotonic()
+                if self.stream or job.segment_limit is not None:
+                    sentences = split_sentences(job.text)
+                    job.segments = sentences[:job.segment_limit]
+                    # Sentences a stale message is cut down from
+                    self.skipped_chars += sum(len(rest) for rest in sentences[len(job.segments):])
+                else:
+                    job.segments = [job.text]
+
+                for done, segment in enumerate(job.segments):
+                    if not job.wants(done):
+                        self.skipped_chars += sum(len(rest) for rest in job.segments[done:])
+                        break
+                    try:
+                        audio = await self._synthesize_segment(loop, segment)
+                    except Exception as e:
+                        job.error = e
+                        self.failed += 1
+                        print(f"Synthesis error for message #{job.seq}: {e}")
+                        continue
+                    if job.first_chunk_at is None:
+                        job.first_chunk_at = time.monotonic()
+                    job.chunks.put_nowait(audio)
+            finally:
+                job.chunks.put_nowait(None)
+                self._synthesis_queue.task_done()
+
+    async def _synthesize_segment(self, loop, text):
+        if self.cache is not None:
+            # Memory hits are answered on the loop; disk lookups and writes go
+            # to the default executor so they never queue behind ONNX inference.
+            audio = self.cache.get_memory(text)
+            if audio is None:
+                audio = await loop.run_in_executor(None, self.cache.get, text)
+            if audio is not None:
+                return audio
+
+        started = time.perf_counter()
+        audio = await loop.run_in_executor(self._synthesis_executor, self.synthesize, text)
+        self.synthesis_seconds += time.perf_counter() - started
+        self.synthesized_audio_seconds += audio.duration
+
+        if self.cache is not None:
+            await loop.run_in_executor(None, self.cache.put, text, audio)
+        return audio
+
+    async def _playback_worker(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            job = await self._playback_queue.get()
+            self._release(job)
+            self._round = max(self._round, job.tag)
+            self._playing = job
+            try:
+                played = []
+                segments = 0
+                self._expire(job)
+
+                while job.wants(segments):
+                    audio = await job.chunks.get()
+                    if audio is None:
+                        break
+                    segments += 1
+
+                    if job.first_audio_at is None:
+                        job.first_audio_at = time.monotonic()
+                        self.first_audio_latencies.append(job.time_to_first_audio)
+                        print(f"Message #{job.seq}: first audio after {job.time_to_first_audio:.2f}s")
+
+                    for piece in audio.slices(self.slice_seconds) if self.slice_seconds else [audio]:
+                        if job.cancelled:
+                            break
+                        await loop.run_in_executor(self._playback_executor, self.play, piece)
+                        played.append(piece)
+
+                if played:
+                    job.played_at = time.monotonic()
+                    job.audio = PcmAudio.concat(played)
+                    self.played += 1
+
+                    if self.on_played:
+                        self.on_played(job)
+            except Exception as e:
+                self.failed += 1
+                print(f"Playback error for message #{job.seq}: {e}")
+            finally:
+                self._playing = None
+                self._playback_queue.task_done()
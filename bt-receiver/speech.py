@@ -0,0 +1,201 @@
+"""
+Speech synthesis helpers for the Memento Cognitio receiver.
+
+Piper produces raw 16-bit PCM; everything past synthesis works on PcmAudio
+and only wraps it in a WAV container when something actually needs a file.
+"""
+
+import io
+import re
+import time
+import wave
+import threading
+
+
+# Longest segment handed to Piper in streaming mode; longer sentences are
+# broken at clause punctuation so the first audio arrives quickly.
+MAX_SEGMENT_CHARS = 120
+
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n+")
+_CLAUSE_BREAK = re.compile(r"(?<=[,;:])\s+")
+_LIST_BULLET = re.compile(r"^(?:[*\-\u2022]|\d+[.)])\s+")
+
+# Spoken once at startup so ONNX session initialization is paid up front
+WARM_UP_TEXT = "Ready."
+
+# espeak-ng phonemization inside Piper is not reentrant, so every voice
+# in a process is driven by one thread at a time.
+_VOICE_LOCK = threading.Lock()
+
+_worker_loader = None
+
+
+class PcmAudio:
+    """Raw PCM audio with its stream format"""
+
+    def __init__(self, pcm, sample_rate, sample_width=2, channels=1):
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.channels = channels
+
+    @property
+    def frame_size(self):
+        return self.sample_width * self.channels
+
+    @property
+    def duration(self):
+        """Length of the clip in seconds"""
+        if not self.sample_rate:
+            return 0.0
+        return len(self.pcm) / (self.sample_rate * self.frame_size)
+
+    def to_wav(self):
+        """Wrap the PCM in a WAV container and return a rewound buffer"""
+        wav_buffer = io.BytesIO()
+        with wave.open(wav_buffer, "wb") as wav_file:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(self.sample_width)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(self.pcm)
+        wav_buffer.seek(0)
+        return wav_buffer
+
+    def slices(self, seconds):
+        """Consecutive clips of at most the given length, split on frames"""
+        size = max(1, int(self.sample_rate * seconds)) * self.frame_size
+        for offset in range(0, len(self.pcm), size):
+            yield PcmAudio(self.pcm[offset:offset + size], self.sample_rate, self.sample_width, self.channels)
+
+    @classmethod
+    def concat(cls, clips):
+        """Join clips that share one stream format"""
+        first = clips[0]
+        return cls(b"".join(clip.pcm for clip in clips), first.sample_rate, first.sample_width, first.channels)
+
+    @classmethod
+    def from_wav(cls, wav_buffer):
+        with wave.open(wav_buffer, "rb") as wav_file:
+            return cls(
+                wav_file.readframes(wav_file.getnframes()),
+                wav_file.getframerate(),
+                wav_file.getsampwidth(),
+                wav_file.getnchannels(),
+            )
+
+
+def split_sentences(text, max_chars=MAX_SEGMENT_CHARS):
+    """Split text into sentences, and over-long sentences into clauses"""
+    segments = []
+
+    for sentence in _SENTENCE_BREAK.split(text):
+        sentence = _LIST_BULLET.sub("", sentence.strip())
+        if not sentence:
+            continue
+
+        if len(sentence) <= max_chars:
+            segments.append(sentence)
+            continue
+
+        current = ""
+        for clause in _CLAUSE_BREAK.split(sentence):
+            if current and len(current) + 1 + len(clause) > max_chars:
+                segments.append(current)
+                current = clause
+            else:
+                current = f"{current} {clause}" if current else clause
+        if current:
+            segments.append(current)
+
+    return segments
+
+
+def synthesize_pcm(voice, text, syn_config=None):
+    """Synthesize text with a PiperVoice into a single PcmAudio clip"""
+    parts = []
+    chunk = None
+
+    with _VOICE_LOCK:
+        for chunk in voice.synthesize(text, syn_config=syn_config):
+            parts.append(chunk.audio_int16_bytes)
+
+    if chunk is None:
+        return PcmAudio(b"", voice.config.sample_rate)
+
+    return PcmAudio(b"".join(parts), chunk.sample_rate, chunk.sample_width, chunk.sample_channels)
+
+
+def synthesis_config(params):
+    """Build a piper SynthesisConfig from a plain dict, or None for defaults"""
+    if not params:
+        return None
+    from piper import SynthesisConfig
+
+    return SynthesisConfig(**params)
+
+
+class VoiceLoader:
+    """Loads a PiperVoice on first use, from any thread, exactly once"""
+
+    def __init__(self, model_path, params=None):
+        self.model_path = model_path
+        self.params = params
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._voice = None
+        self._config = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._voice is not None
+
+    def get(self):
+        if self._voice is None:
+            with self._lock:
+                if self._voice is None:
+                    started = time.perf_counter()
+                    from piper import PiperVoice
+
+                    voice = PiperVoice.load(self.model_path)
+                    self._config = synthesis_config(self.params)
+                    self.load_seconds = time.perf_counter() - started
+                    self._voice = voice
+        return self._voice
+
+    def synthesize(self, text):
+        return synthesize_pcm(self.get(), text, self._config)
+
+    def warm_up(self, text=WARM_UP_TEXT):
+        """Load the voice and run one throwaway synthesis; returns (load, warm-up) seconds"""
+        self.get()
+        if self.warm_up_seconds is None:
+            started = time.perf_counter()
+            self.synthesize(text)
+            self.warm_up_seconds = time.perf_counter() - started
+        return self.load_seconds, self.warm_up_seconds
+
+
+def init_worker(model_path, params=None):
+    """Process-pool initializer: load a private voice for this worker"""
+    global _worker_loader
+
+    _worker_loader = VoiceLoader(model_path, params)
+    _worker_loader.get()
+
+
+def warm_up_worker():
+    """Process-pool task: warm up the worker's voice"""
+    return _worker_loader.warm_up()
+
+
+def synthesize_in_worker(text):
+    """Process-pool task: synthesize with the worker's own voice"""
+    return _worker_loader.synthesize(text)
+
+
+def synthesize_timed_in_worker(text):
+    """Process-pool task: synthesize and return (audio, seconds it took)"""
+    started = time.perf_counter()
+    audio = _worker_loader.synthesize(text)
+    return audio, time.perf_counter() - started
@@ -0,0 +1,214 @@
+"""
+Per-capture latency tracing for the Memento Cognitio receiver.
+
+The firmware follows each framed message with a trace frame carrying the
+capture id, prompt mode and per-stage timings (capture, encode, Gemini
+connection, upload and response, BLE write). The receiver joins it with
+its own stages - framing, queueing, synthesis and playback start - and
+appends one JSON line per capture to a session file. Summaries give
+percentiles per prompt mode:
+
+    python bt-receiver/tracing.py bt-receiver/traces/<session>.jsonl
+"""
+
+import sys
+import json
+import math
+import time
+import datetime
+from pathlib import Path
+
+
+# Firmware traces kept while waiting for their message to be spoken
+MAX_PENDING_TRACES = 64
+
+# Firmware stages that precede the first streamed text, in order
+FIRMWARE_STAGES_TO_FIRST_TEXT = ("ui", "capture", "encode", "connect", "upload", "llm_first")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, or None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+def _ms(start, end):
+    if start is None or end is None:
+        return None
+    return round((end - start) * 1000, 1)
+
+
+class CaptureTracer:
+    """Joins firmware traces with receiver timings, one record per capture.
+
+    The two halves may arrive in either order: a streamed response starts
+    playing long before its firmware trace is sent. Whichever half comes
+    second completes the record. Message ids are only unique per camera, so
+    halves are matched by camera address and id.
+    """
+
+    def __init__(self, directory, session=None):
+        session = session or datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+        self.path = Path(directory) / f"{session}.jsonl"
+        self.records = []
+        self._firmware = {}
+        self._receiver = {}
+        self._file = None
+
+    def add_firmware_trace(self, message_id, payload, camera=None):
+        """Attach the firmware's trace frame for a message"""
+        try:
+            trace = json.loads(payload)
+        except ValueError as e:
+            print(f"Ignoring malformed trace for message {message_id}: {e}")
+            return
+
+        record = self._receiver.pop((camera, message_id), None)
+        if record is not None:
+            self._finish(record, trace)
+            return
+
+        self._firmware[(camera, message_id)] = trace
+        while len(self._firmware) > MAX_PENDING_TRACES:
+            del self._firmware[next(iter(self._firmware))]
+
+    def record(self, job):
+        """Take the receiver's timings for a message that has just been spoken"""
+        meta = job.meta
+        # Later parts of a streamed response say nothing new about latency
+        if meta.get("part", 1) > 1:
+            return
+
+        message_id = meta.get("message_id")
+        camera = meta.get("camera")
+        key = (camera, message_id)
+        record = {
+            "time": time.time(),
+            "camera": camera,
+            "message": message_id,
+            "chars": len(job.text),
+            "receiver_ms": {
+                "framing": _ms(meta.get("first_byte_at"), meta.get("completed_at")),
+                "queue": _ms(job.received_at, job.synthesis_started_at),
+                "synthesis": _ms(job.synthesis_started_at, job.first_chunk_at),
+                "playback_start": _ms(job.received_at, job.first_audio_at),
+                "playback": _ms(job.first_audio_at, job.played_at),
+            },
+        }
+
+        if message_id is None:
+            self._finish(record, None)
+        elif key in self._firmware:
+            self._finish(record, self._firmware.pop(key))
+        else:
+            # Anything still waiting from this camera is from an earlier
+            # capture whose trace never came (e.g. traces disabled on it)
+            self.flush(camera)
+            self._receiver[key] = record
+
+    def _finish(self, record, firmware):
+        firmware = firmware or {}
+        stages = firmware.get("stages_ms", {})
+        record["capture"] = firmware.get("capture")
+        record["mode"] = firmware.get("mode", "unknown")
+        record["firmware_ms"] = stages
+        record["firmware_total_ms"] = firmware.get("total_ms")
+        record["firmware_info"] = firmware.get("info", {})
+
+        # Clocks differ between devices, so the end-to-end figure is a sum of
+        # stage durations. Streamed responses are spoken from the first text.
+        if "llm_first" in stages:
+            firmware_ms = sum(stages.get(stage, 0) for stage in FIRMWARE_STAGES_TO_FIRST_TEXT)
+        else:
+            firmware_ms = record["firmware_total_ms"]
+        receiver_ms = record["receiver_ms"]
+        if firmware_ms is not None and receiver_ms["playback_start"] is not None:
+            record["press_to_audio_ms"] = round(
+                firmware_ms + (receiver_ms["framing"] or 0) + receiver_ms["playback_start"], 1
+            )
+
+        self.records.append(record)
+        self._write(record)
+        return record
+
+    def flush(self, camera=None):
+        """Write records still waiting for a firmware trace without it.
+
+        With a camera, only that camera's records; otherwise all of them.
+        """
+        for key in list(self._receiver):
+            if camera is None or key[0] == camera:
+                self._finish(self._receiver.pop(key), None)
+
+    def _write(self, record):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def summarize(records):
+    """Per prompt mode: p50/p95/max of every stage across the records"""
+    samples = {}
+    for record in records:
+        stages = samples.setdefault(record.get("mode", "unknown"), {})
+        for stage, value in record.get("firmware_ms", {}).items():
+            stages.setdefault(f"fw.{stage}", []).append(value)
+        for stage, value in record.get("receiver_ms", {}).items():
+            if value is not None:
+                stages.setdefault(f"rx.{stage}", []).append(value)
+        if "press_to_audio_ms" in record:
+            stages.setdefault("press_to_audio", []).append(record["press_to_audio_ms"])
+        ble_tx = record.get("firmware_info", {}).get("ble_tx")
+        if ble_tx and ble_tx.get("ms"):
+            stages.setdefault("fw.ble_tx_rate", []).append(round(ble_tx["bytes"] * 1000 / ble_tx["ms"], 1))
+            stages.setdefault("fw.ble_tx_retries", []).append(ble_tx["retries"])
+
+    return {
+        mode: {
+            stage: {
+                "count": len(values),
+                "p50": percentile(values, 0.5),
+                "p95": percentile(values, 0.95),
+                "max": max(values),
+            }
+            for stage, values in stages.items()
+        }
+        for mode, stages in samples.items()
+    }
+
+
+# Units of the summary rows that are not durations
+UNITS = {"fw.ble_tx_rate": "B/s", "fw.ble_tx_retries": ""}
+
+
+def print_summary(records):
+    for mode, stages in summarize(records).items():
+        print(f"{mode}:")
+        for stage, row in stages.items():
+            unit = UNITS.get(stage, "ms")
+            print(f"  {stage:<20} n={row['count']:<4} p50={row['p50']:>9.1f}{unit:<3}"
+                  f"  p95={row['p95']:>9.1f}{unit:<3}  max={row['max']:>9.1f}{unit}")
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python tracing.py <traces.jsonl> [...]")
+        sys.exit(1)
+
+    print_summary([record for path in sys.argv[1:] for record in load_records(path)])
@@ -0,0 +1,229 @@
+"""
+Synthesized speech cache for the Memento Cognitio receiver.
+
+Clips are keyed by normalized text, a fingerprint of the voice model and the
+synthesis parameters. Recent clips stay in memory; every clip is also written
+to disk so repeats survive a restart. Both tiers evict least recently used
+entries once their byte budget is exceeded.
+"""
+
+import os
+import struct
+import hashlib
+import threading
+import unicodedata
+import collections
+from pathlib import Path
+
+from speech import PcmAudio
+
+
+CACHE_MEMORY_BYTES = 32 * 1024 * 1024
+CACHE_DISK_BYTES = 256 * 1024 * 1024
+
+# magic, sample rate, sample width, channels
+_HEADER = struct.Struct("<4sIBB")
+_MAGIC = b"MCPC"
+_SUFFIX = ".pcm"
+
+
+def normalize_text(text):
+    """Collapse whitespace and unicode variants that do not change the speech"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def model_fingerprint(*paths):
+    """Hash the voice model files so a new model never reuses old clips"""
+    digest = hashlib.sha256()
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+class SpeechCache:
+    """Two-tier LRU cache of PcmAudio clips"""
+
+    def __init__(self, directory, fingerprint, params=None,
+                 memory_bytes=CACHE_MEMORY_BYTES, disk_bytes=CACHE_DISK_BYTES):
+        self.directory = Path(directory)
+        # Either the fingerprint itself or a callable producing it; hashing
+        # a model takes a moment, so callers may defer it off the hot path.
+        self._fingerprint = fingerprint
+        self.params = repr(sorted((params or {}).items()))
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._fingerprint_lock = threading.Lock()
+        self._memory = collections.OrderedDict()
+        self._memory_size = 0
+        self._disk = collections.OrderedDict()
+        self._disk_size = 0
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._load_disk_index()
+
+    def _load_disk_index(self):
+        entries = []
+        for path in self.directory.glob("*" + _SUFFIX):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_size += size
+
+        with self._lock:
+            self._evict_disk()
+
+    @property
+    def fingerprint(self):
+        if callable(self._fingerprint):
+            with self._fingerprint_lock:
+                if callable(self._fingerprint):
+                    self._fingerprint = self._fingerprint()
+        return self._fingerprint
+
+    def key(self, text):
+        material = f"{self.fingerprint}\0{self.params}\0{normalize_text(text)}"
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / (key + _SUFFIX)
+
+    def __contains__(self, text):
+        """Whether a clip is cached, without reading it"""
+        key = self.key(text)
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get_memory(self, text):
+        """Look up the in-memory tier only; safe to call from the event loop"""
+        key = self.key(text)
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+            return audio
+
+    def get(self, text):
+        """Look up a clip in memory, then on disk; returns None on a miss"""
+        key = self.key(text)
+
+        with self._lock:
+            audio = self._memory.get(key)
+            if audio is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return audio
+            on_disk = key in self._disk
+
+        if on_disk:
+            audio = self._read(key)
+            if audio is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    if key in self._disk:
+                        self._disk.move_to_end(key)
+                    self._remember(key, audio)
+                return audio
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, text, audio):
+        """Store a freshly synthesized clip in both tiers"""
+        key = self.key(text)
+
+        with self._lock:
+            self._remember(key, audio)
+            if key in self._disk:
+                self._disk.move_to_end(key)
+                return
+
+        size = self._write(key, audio)
+        if size is None:
+            return
+
+        with self._lock:
+            self._disk[key] = size
+            self._disk_size += size
+            self._evict_disk()
+
+    def _remember(self, key, audio):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        size = len(audio.pcm)
+        if size > self.memory_bytes:
+            return
+
+        self._memory[key] = audio
+        self._memory_size += size
+
+        while self._memory_size > self.memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted.pcm)
+
+    def _evict_disk(self):
+        while self._disk and self._disk_size > self.disk_bytes:
+            key, size = self._disk.popitem(last=False)
+            self._disk_size -= size
+            self.evictions += 1
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def _read(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                magic, rate, width, channels = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != _MAGIC:
+                    return None
+                pcm = f.read()
+            os.utime(path)
+        except (OSError, struct.error):
+            return None
+        return PcmAudio(pcm, rate, width, channels)
+
+    def _write(self, key, audio):
+        path = self._path(key)
+        tmp_path = path.with_suffix(".tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, audio.sample_rate, audio.sample_width, audio.channels))
+                f.write(audio.pcm)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Speech cache write failed: {e}")
+            return None
+        return _HEADER.size + len(audio.pcm)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else None,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_size,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_size,
+            }
@@ -14,25 +14,54 @@ Project: Memento Cognitio – AI-powered visual cognition device
 import ssl
 import time
 import wifi
+import asyncio
 import displayio
-import terminalio
 import socketpool
 
 import adafruit_requests
 import adafruit_pycamera
 import adafruit_imageload
-from adafruit_display_text import label
 
 from manager import BluetoothManager, WiFiManager, BuzzerManager, LLMManager
-from constants import PROMPT_MODES, MESSAGE_DISPLAY_TIME, ERROR_DISPLAY_TIME
+from manager.tracing import CaptureTrace
+from manager.cache import ResponseCache, average_hash
+from manager.offline import CaptureQueue
+from manager.display import DisplayManager
+from constants import PROMPT_MODES, CAPTURE_PROFILES, DEFAULT_CAPTURE_PROFILE, MESSAGE_DISPLAY_TIME, ERROR_DISPLAY_TIME
+from constants import STATUS_DISPLAY_TIME, BUSY_PRESS_POLICY, MAX_QUEUED_CAPTURES, BLE_CHECK_INTERVAL
+from constants import RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_DISTANCE, RESPONSE_CACHE_FILE
+from constants import OFFLINE_QUEUE_DIR, OFFLINE_BATCH_SIZE, OFFLINE_RETRY_INTERVAL, TIMEZONE_OFFSET
+from constants import GEMINI_KEEPALIVE_INTERVAL, RECONNECT_MIN_DELAY, RECONNECT_MAX_DELAY
+from constants import DISPLAY_WRAP_CACHE_ENTRIES, DISPLAY_WRAP_CACHE_MAX_CHARS
 
 
 class MementoCognitioApp:
-    """Main application """
+    """Main application.
+    
+    run() drives independent asyncio tasks: live preview, button input,
+    Gemini requests, BLE transmission, the buzzer and display timeouts.
+    A press captures immediately; its request runs in the background.
+    """
     
     def __init__(self):
+        # While text is on screen the preview is paused, until text_until
+        # or indefinitely when it is None
+        self.showing_text = False
+        self.text_until = None
+        # Captures waiting for Gemini and the task working through them
+        self.pending = []
+        self.request_task = None
+        # (text, partial, trace) waiting to be sent over BLE, in order
+        self.outbox = []
+        
         self.pycam = adafruit_pycamera.PyCamera()
-        self.pycam.resolution = 5
+        self.screen = DisplayManager(self.pycam.display, DISPLAY_WRAP_CACHE_ENTRIES, DISPLAY_WRAP_CACHE_MAX_CHARS)
+        for _, status, _ in PROMPT_MODES.values():
+            # Mode banners are shown on every press; wrap them once up front
+            self.screen.wrap(status, 20)
+        self.capture_profile = None
+        self.apply_capture_profile(DEFAULT_CAPTURE_PROFILE)
+        self.capture_count = 0
 
         self.buzzer = BuzzerManager(self.pycam)
         
@@ -49,13 +78,30 @@ class MementoCognitioApp:
             self.display_fullscreen_text("BLE Timeout\nContinuing...", text_color=0xFFA500)
             time.sleep(2)
         
-        if not WiFiManager.connect():
+        # Captures made without a network wait here for it to come back
+        self.captures = CaptureQueue(OFFLINE_QUEUE_DIR) if OFFLINE_QUEUE_DIR else None
+        
+        self.pool = socketpool.SocketPool(wifi.radio)
+        if WiFiManager.connect():
+            WiFiManager.sync_clock(self.pool, TIMEZONE_OFFSET)
+        elif self.captures and self.captures.available:
+            self.display_error("WiFi Failed!\nOffline mode")
+            time.sleep(ERROR_DISPLAY_TIME)
+        else:
             self.display_error("WiFi Failed!")
             raise Exception("WiFi connection failed")
         
-        pool = socketpool.SocketPool(wifi.radio)
-        requests = adafruit_requests.Session(pool, ssl.create_default_context())
-        self.llm = LLMManager(requests)
+        ssl_context = ssl.create_default_context()
+        requests = adafruit_requests.Session(self.pool, ssl_context)
+        self.llm = LLMManager(requests, self.pool, ssl_context)
+        if WiFiManager.connected():
+            # DNS and the TLS handshake now rather than on the first press
+            self.llm.warm_up()
+        
+        self.responses = None
+        if RESPONSE_CACHE_ENTRIES:
+            self.responses = ResponseCache(RESPONSE_CACHE_ENTRIES, RESPONSE_CACHE_TTL,
+                                           RESPONSE_CACHE_MAX_DISTANCE, RESPONSE_CACHE_FILE)
     
     def display_startup_image(self, image_path="/splash.bmp"):
         try:            
@@ -64,33 +110,7 @@ class MementoCognitioApp:
                 bitmap=displayio.Bitmap,
                 palette=displayio.Palette
             )
-            
-            display_width = self.pycam.display.width
-            display_height = self.pycam.display.height
-            image_width = bitmap.width
-            image_height = bitmap.height
-            
-            x_offset = (display_width - image_width) // 2
-            y_offset = (display_height - image_height) // 2
-            
-            group = displayio.Group()
-            
-            bg_bitmap = displayio.Bitmap(display_width, display_height, 1)
-            bg_palette = displayio.Palette(1)
-            bg_palette[0] = 0x000000  # Black
-            bg_sprite = displayio.TileGrid(bg_bitmap, pixel_shader=bg_palette, x=0, y=0)
-            group.append(bg_sprite)
-            
-            tile_grid = displayio.TileGrid(
-                bitmap, 
-                pixel_shader=palette,
-                x=x_offset,
-                y=y_offset
-            )
-            group.append(tile_grid)
-            
-            self.pycam.display.root_group = group
-            self.pycam.display.refresh()
+            self.screen.show_image(bitmap, palette)
             
             print(f"Displayed startup image: {image_path}")
             
@@ -100,115 +120,350 @@ class MementoCognitioApp:
             
     def display_fullscreen_text(self, text, bg_color=0x000000, text_color=0xFFFFFF, scale=2, max_chars_per_line=20):
         """Display text on black background filling the entire screen"""
-        group = displayio.Group()
+        self.screen.show_text(text, bg_color, text_color, scale, max_chars_per_line)
+    
+    def hold_display(self, seconds=None):
+        """Keep what is on screen from the preview, for seconds or until cleared"""
+        self.showing_text = True
+        self.text_until = time.monotonic() + seconds if seconds else None
+    
+    def show_text(self, text, seconds=None, **kwargs):
+        self.display_fullscreen_text(text, **kwargs)
+        self.hold_display(seconds)
+    
+    def clear_text(self):
+        self.display_fullscreen_text("", text_color=0xFFFF00)
+        self.showing_text = False
+        self.text_until = None
+    
+    def display_error(self, message, seconds=None):
+        """Display error message on black background"""
+        self.show_text(message, seconds, bg_color=0x000000, text_color=0xFF0000, scale=2)
+        self.buzzer.play_error_beep()
+    
+    def apply_capture_profile(self, name):
+        """Switch resolution and JPEG quality, touching the camera only on a change"""
+        if name == self.capture_profile:
+            return
+        
+        profile = CAPTURE_PROFILES[name]
+        # Setting the resolution also writes it to NVM and redraws the overlay
+        if self.pycam.resolutions[self.pycam.resolution] != profile["resolution"]:
+            self.pycam.resolution = profile["resolution"]
+        self.pycam.camera.quality = profile["quality"]
+        self.capture_profile = name
+        print(f"Capture profile: {name} ({profile['resolution']}, quality {profile['quality']})")
+    
+    def frame_hash(self):
+        """Perceptual hash of the current preview frame, or None without a cache"""
+        if not self.responses:
+            return None
+        try:
+            return average_hash(self.pycam.continuous_capture())
+        except Exception as e:
+            print(f"Frame hash failed: {e}")
+            return None
+    
+    def show_result(self, text):
+        self.show_text(text, MESSAGE_DISPLAY_TIME, text_color=0x00FFFF, scale=2 if len(text.split()) < 20 else 1, max_chars_per_line=20 if len(text.split()) < 20 else 40)
+    
+    def replay_cached(self, button_name, text):
+        """Answer a press from the response cache without capturing"""
+        self.capture_count += 1
+        trace = CaptureTrace(self.capture_count, button_name)
+        trace.mark("cache")
+        trace.info["cached"] = True
+        
+        print(f"Cached answer: {text}")
+        self.buzzer.play_success_beep()
+        self.send(text, trace=trace)
+        self.show_result(text)
+    
+    def capture(self, button_name, frame_hash=None):
+        """Take the picture for a press; returns a pending request or None"""
+        print("Button Pressed! Capturing...")       
+        self.capture_count += 1
+        trace = CaptureTrace(self.capture_count, button_name)
         
-        bitmap = displayio.Bitmap(self.pycam.display.width, self.pycam.display.height, 1)
-        palette = displayio.Palette(1)
-        palette[0] = bg_color
+        self.buzzer.play_button_press()
+        self.show_text(PROMPT_MODES[button_name][1], STATUS_DISPLAY_TIME, text_color=0xFFFF00, scale=2)
+        trace.mark("ui")
         
-        bg_sprite = displayio.TileGrid(bitmap, pixel_shader=palette, x=0, y=0)
-        group.append(bg_sprite)
+        try:
+            self.apply_capture_profile(PROMPT_MODES[button_name][2])
+            image_data = self.pycam.capture_into_jpeg()
+            trace.mark("capture")
+            trace.info["jpeg_bytes"] = len(image_data)
+            trace.info["profile"] = self.capture_profile
+            return button_name, image_data, trace, frame_hash
         
-        words = text.split()
-        lines = []
-        current_line = ""
+        except Exception as e:
+            print(f"Crash: {e}")
+            self.display_error("Error!", ERROR_DISPLAY_TIME)
+            return None
         
-        for word in words:
-            test_line = current_line + " " + word if current_line else word
-            if len(test_line) <= max_chars_per_line:
-                current_line = test_line
-            else:
-                if current_line:
-                    lines.append(current_line)
-                current_line = word
-        
-        if current_line:
-            lines.append(current_line)
-        
-        wrapped_text = "\n".join(lines)
-        
-        text_area = label.Label(
-            terminalio.FONT,
-            text=wrapped_text,
-            color=text_color,
-            scale=scale,
-            anchor_point=(0.5, 0.5),
-            anchored_position=(self.pycam.display.width // 2, self.pycam.display.height // 2)
-        )
+        finally:
+            self.pycam.live_preview_mode()
+    
+    def on_press(self, button_name):
+        """Capture now and queue the request according to BUSY_PRESS_POLICY"""
+        frame_hash = self.frame_hash()
+        if frame_hash is not None:
+            cached = self.responses.lookup(frame_hash, button_name)
+            if cached is not None:
+                self.replay_cached(button_name, cached)
+                return
+        
+        busy = self.busy()
+        if busy and (BUSY_PRESS_POLICY == "ignore" or
+                     (BUSY_PRESS_POLICY == "queue" and len(self.pending) >= MAX_QUEUED_CAPTURES)):
+            print(f"Busy, ignoring {button_name}")
+            self.buzzer.play_error_beep()
+            return
+        
+        request = self.capture(button_name, frame_hash)
+        if request is None:
+            return
+        
+        if not WiFiManager.connected() and self.queue_offline(button_name, request[1]):
+            return
         
-        group.append(text_area)
+        if busy and BUSY_PRESS_POLICY == "cancel":
+            print("Cancelling the request in flight")
+            self.request_task.cancel()
+            self.pending.clear()
+            # Close any half-streamed message before the next one starts
+            self.send("")
+            busy = False
         
-        self.pycam.display.root_group = group
-        self.pycam.display.refresh()
+        self.pending.append(request)
+        if not busy:
+            self.request_task = asyncio.create_task(self.process_requests())
     
-    def display_error(self, message):
-        """Display error message on black background"""
-        self.display_fullscreen_text(message, bg_color=0x000000, text_color=0xFF0000, scale=2)
-        self.buzzer.play_error_beep()
+    def queue_offline(self, button_name, image_data):
+        """Keep a capture on the SD card until the network is back"""
+        if not (self.captures and self.captures.available):
+            return False
+        try:
+            self.captures.add(image_data, button_name)
+        except OSError as e:
+            print(f"Could not queue capture: {e}")
+            return False
+        self.show_text(f"Offline\nSaved for later ({len(self.captures.names())} waiting)", ERROR_DISPLAY_TIME, text_color=0xFFA500)
+        return True
     
-    def process_capture(self, button_name="shutter"):
-        """Handle image capture and AI analysis"""
-        print("Button Pressed! Capturing...")       
-        self.buzzer.play_button_press()
-        self.display_fullscreen_text(PROMPT_MODES[button_name][1], text_color=0xFFFF00, scale=2)
+    def send(self, text, partial=False, trace=None):
+        self.outbox.append((text, partial, trace))
+    
+    async def process_requests(self):
+        while self.pending:
+            await self.request(*self.pending.pop(0))
+    
+    async def request(self, button_name, image_data, trace, frame_hash=None):
+        """Ask Gemini about one capture and hand the answer to BLE and the display"""
+        # Sentences are forwarded over BLE while Gemini is still generating
+        streamed = {"sent": False, "final": False}
+        
+        def forward(text, final):
+            if text:
+                streamed["sent"] = True
+            if final and not streamed["sent"]:
+                # Nothing was streamed; the result is sent below
+                return
+            self.send(text, partial=not final, trace=trace if final else None)
+            streamed["final"] = final
         
         try:
-            image_data = self.pycam.capture_into_jpeg()
-            
-            result_text = self.llm.analyze_image(image_data, prompt=PROMPT_MODES[button_name][0])
+            result_text = await self.llm.analyze_image(image_data, prompt=PROMPT_MODES[button_name][0], trace=trace, on_text=forward)
             print(f"Gemini says: {result_text}")
             
+            if self.llm.network_error and not streamed["sent"] and self.queue_offline(button_name, image_data):
+                return
+            
             self.buzzer.play_success_beep()
+            trace.mark("beep")
             
-            if self.bluetooth.send_message(result_text):
-                self.buzzer.play_bluetooth_beep()
+            if not streamed["final"]:
+                # Not streamed, or the stream broke off: send the result,
+                # which also completes any open stream
+                self.send(result_text, trace=trace)
             
-            self.display_fullscreen_text(result_text, text_color=0x00FFFF, scale=2 if len(result_text.split()) < 20 else 1, max_chars_per_line=20 if len(result_text.split()) < 20 else 40)
-            time.sleep(MESSAGE_DISPLAY_TIME)
-            self.display_fullscreen_text("", text_color=0xFFFF00)
+            if frame_hash is not None and self.llm.last_error is None:
+                self.responses.store(frame_hash, button_name, result_text)
             
+            self.show_result(result_text)
+        
         except Exception as e:
             print(f"Crash: {e}")
-            self.display_error("Error!")
-            time.sleep(ERROR_DISPLAY_TIME)
-        
-        finally:
-            self.pycam.live_preview_mode()
+            self.display_error("Error!", ERROR_DISPLAY_TIME)
     
-    def run(self):
-        """Main application loop"""
-        print("Memento Cognitio Ready")
-        self.display_startup_image()
-        self.buzzer.play_startup_beep()
+    async def drain_offline(self):
+        """Upload queued captures in batches, then any presses made meanwhile"""
+        while True:
+            names = self.captures.names()[:OFFLINE_BATCH_SIZE]
+            if not names:
+                break
+            queued = [self.captures.load(name) for name in names]
+            print(f"Uploading {len(names)} queued captures")
+            
+            answers = await self.llm.analyze_batch([image for image, _ in queued],
+                                                   [PROMPT_MODES[meta["mode"]][0] for _, meta in queued])
+            if answers is None and len(names) > 1 and not self.llm.network_error:
+                # The batch was answered but not as asked; go one at a time
+                answers = []
+                for image, meta in queued:
+                    answers.append(await self.llm.analyze_image(image, prompt=PROMPT_MODES[meta["mode"]][0]))
+                    if self.llm.network_error:
+                        answers.pop()
+                        break
+            if not answers:
+                if self.llm.network_error:
+                    break
+                answers = [self.llm.last_error] * len(names)
+            
+            for name, (_, meta), answer in zip(names, queued, answers):
+                self.send(self.tag_capture_time(answer, meta))
+                self.captures.remove(name)
+            if len(answers) < len(names):
+                break
         
-        self.pycam.live_preview_mode()
+        await self.process_requests()
+    
+    def tag_capture_time(self, text, meta):
+        if not meta.get("clock_set"):
+            return f"From an earlier capture: {text}"
+        hour, minute = time.localtime(int(meta["time"]))[3:5]
+        return f"Captured at {hour:02d}:{minute:02d}: {text}"
+    
+    async def offline_loop(self):
+        """Upload queued captures once the network is back"""
+        while True:
+            await asyncio.sleep(OFFLINE_RETRY_INTERVAL)
+            if not (self.captures and self.captures.names()):
+                continue
+            # Live requests go first; network_loop brings WiFi back
+            if self.busy() or not WiFiManager.connected():
+                continue
+            
+            self.request_task = asyncio.create_task(self.drain_offline())
+    
+    def busy(self):
+        return self.request_task is not None and not self.request_task.done()
+    
+    async def network_loop(self):
+        """Reconnect WiFi and Gemini with backoff, and keep the connection warm.
         
+        Nothing here runs while a request is in flight. Joining WiFi, setting
+        the clock and the TLS handshake are blocking calls that still freeze
+        the preview, buttons and BLE while they last (the handshake for at
+        most GEMINI_IDLE_TIMEOUT); they only happen after a connection drops.
+        """
+        delay = RECONNECT_MIN_DELAY
         while True:
-            self.bluetooth.check_connection()
+            if self.busy():
+                ok = True
+            elif not WiFiManager.connected():
+                self.llm.connected = False
+                ok = WiFiManager.connect()
+                if ok:
+                    WiFiManager.sync_clock(self.pool, TIMEZONE_OFFSET)
+            elif not self.llm.connected:
+                ok = self.llm.warm_up()
+            else:
+                # A failed ping marks the connection closed for the next round
+                if time.monotonic() - self.llm.last_used > GEMINI_KEEPALIVE_INTERVAL:
+                    await self.llm.keep_alive()
+                ok = True
             
+            if ok:
+                delay = RECONNECT_MIN_DELAY
+                await asyncio.sleep(1)
+            else:
+                print(f"Network down, retrying in {delay} s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+    
+    async def preview_loop(self):
+        while True:
+            if not self.showing_text:
+                self.pycam.blit(self.pycam.continuous_capture())
+            await asyncio.sleep(0)
+    
+    async def input_loop(self):
+        while True:
             self.pycam.keys_debounce()
-            self.pycam.blit(self.pycam.continuous_capture())
             
             if self.pycam.shutter.short_count > 0:
-                self.process_capture(button_name="shutter")
+                self.on_press("shutter")
 
             elif self.pycam.up.rose > 0:
-                self.process_capture(button_name="up")
+                self.on_press("up")
 
             elif self.pycam.down.rose > 0:
-                self.process_capture(button_name="down")
+                self.on_press("down")
 
             elif self.pycam.left.rose > 0:
-                self.process_capture(button_name="left")
+                self.on_press("left")
 
             elif self.pycam.right.rose > 0:
-                self.process_capture(button_name="right")
+                self.on_press("right")
 
             elif self.pycam.select.rose > 0:
-                self.process_capture(button_name="select")
+                self.on_press("select")
 
             elif self.pycam.ok.rose > 0:
-                self.process_capture(button_name="ok")
+                self.on_press("ok")
+            
+            await asyncio.sleep(0)
+    
+    async def bluetooth_loop(self):
+        """Send queued messages in order and keep advertising while disconnected"""
+        next_check = 0
+        while True:
+            if time.monotonic() >= next_check:
+                self.bluetooth.check_connection()
+                next_check = time.monotonic() + BLE_CHECK_INTERVAL
+            
+            while self.outbox:
+                text, partial, trace = self.outbox.pop(0)
+                sent = await self.bluetooth.send_message(text, partial=partial)
+                if trace:
+                    if sent:
+                        trace.mark("ble")
+                        await self.bluetooth.send_trace(trace)
+                        self.buzzer.play_bluetooth_beep()
+                    print(f"Capture #{trace.capture_id} stages (ms): {trace.stages}")
+                await asyncio.sleep(0)
+            
+            await asyncio.sleep(0.05)
+    
+    async def display_loop(self):
+        """Clear timed text so the preview comes back"""
+        while True:
+            if self.text_until is not None and time.monotonic() >= self.text_until:
+                self.clear_text()
+            await asyncio.sleep(0.1)
+    
+    async def main(self):
+        await asyncio.gather(
+            asyncio.create_task(self.preview_loop()),
+            asyncio.create_task(self.input_loop()),
+            asyncio.create_task(self.bluetooth_loop()),
+            asyncio.create_task(self.display_loop()),
+            asyncio.create_task(self.buzzer.run()),
+            asyncio.create_task(self.offline_loop()),
+            asyncio.create_task(self.network_loop()),
+        )
+    
+    def run(self):
+        """Main application loop"""
+        print("Memento Cognitio Ready")
+        self.display_startup_image()
+        self.hold_display(1.5)
+        self.buzzer.play_startup_beep()
+        
+        self.pycam.live_preview_mode()
+        asyncio.run(self.main())
 
 
 if __name__ == "__main__":
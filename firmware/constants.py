@@ -3,12 +3,83 @@ GEMINI_MODEL = "gemini-2.5-flash"
 GEMINI_PROMPT = "Briefly describe this in 20 words or less."
 MESSAGE_DISPLAY_TIME = 7
 ERROR_DISPLAY_TIME = 2
+# Seconds a mode's status text stays up before the live preview returns
+STATUS_DISPLAY_TIME = 1.5
+# Wrapped screen text kept for reuse: how many strings, and only those up to
+# this length (status banners, not Gemini answers)
+DISPLAY_WRAP_CACHE_ENTRIES = 24
+DISPLAY_WRAP_CACHE_MAX_CHARS = 64
+# What a press does while a Gemini request is in flight: "queue" its capture,
+# "cancel" the request in flight, or "ignore" the press
+BUSY_PRESS_POLICY = "queue"
+MAX_QUEUED_CAPTURES = 2
+# Seconds between BLE connection checks
+BLE_CHECK_INTERVAL = 0.5
+# Raw JPEG bytes base64-encoded and sent per socket write; 0 builds the
+# whole request body in memory instead
+UPLOAD_CHUNK_SIZE = 768
+# Seconds a Gemini socket waits for the server before giving up, as
+# adafruit_requests does; answers often take longer than a second to start
+GEMINI_TIMEOUT = 60
+# Use streamGenerateContent and forward each sentence over BLE as it arrives
+GEMINI_STREAM_RESPONSES = True
+# Hold back streamed text until at least this much forms complete sentences
+STREAM_MIN_SENTENCE_CHARS = 20
+# Send length-prefixed frames with message ids instead of newline-terminated text
+BLE_FRAMED_MESSAGES = True
+# Follow each framed message with its capture's per-stage timings
+BLE_SEND_TRACES = True
+# Notifications are sized to the connection's MTU within these bounds
+BLE_MIN_PACKET_SIZE = 20
+BLE_MAX_PACKET_SIZE = 512
+# Seconds between notifications; a refused notification is retried with
+# a growing delay up to BLE_TX_RETRIES times
+BLE_PACKET_INTERVAL = 0.005
+BLE_TX_RETRIES = 3
+# DEFLATE framed payloads at least this long once the receiver has said it
+# can inflate them; 0 disables compression
+BLE_COMPRESS_MIN_BYTES = 160
+# Without a network, captures are kept here (on the SD card) and uploaded
+# once WiFi is back, up to OFFLINE_BATCH_SIZE images per Gemini request;
+# None drops them instead
+OFFLINE_QUEUE_DIR = "/sd/offline"
+OFFLINE_BATCH_SIZE = 3
+# Seconds between checks for queued captures and the network
+OFFLINE_RETRY_INTERVAL = 30
+# Seconds of idle after which the pooled Gemini connection is pinged
+GEMINI_KEEPALIVE_INTERVAL = 60
+# Seconds the background warm-up and keep-alive wait on Gemini; connecting
+# blocks the preview and buttons for up to this long
+GEMINI_IDLE_TIMEOUT = 5
+# WiFi and Gemini reconnects back off from the first delay to the second (s)
+RECONNECT_MIN_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+# Hours from UTC for capture times set over NTP
+TIMEZONE_OFFSET = 0
+# Answer repeat presses at the same scene from a cache of recent responses:
+# at most this many entries (0 disables it), for this many seconds, when the
+# preview's 64-bit average hash differs in at most this many bits
+RESPONSE_CACHE_ENTRIES = 16
+RESPONSE_CACHE_TTL = 300
+RESPONSE_CACHE_MAX_DISTANCE = 6
+# Also keep the cache here, e.g. on the SD card; None keeps it in memory only
+RESPONSE_CACHE_FILE = "/sd/response_cache.json"
+# Capture settings per prompt mode: a resolution from adafruit_pycamera's
+# list and the sensor's JPEG quality (0-63, lower is better). Smaller images
+# capture, encode and upload faster, so only modes that need detail get them.
+CAPTURE_PROFILES = {
+    "low": {"resolution": "640x480", "quality": 20},
+    "medium": {"resolution": "800x600", "quality": 15},
+    "high": {"resolution": "1280x720", "quality": 10},
+}
+DEFAULT_CAPTURE_PROFILE = "medium"
+# [prompt, status text, capture profile]
 PROMPT_MODES = {
-    "shutter": ["Briefly describe this in 20 words or less.", "Providing a brief description of this image."],
-    "up": ["What objects or items do you see in this image? List them. Do not say anything else.", "Listing the objects or items in this image."],
-    "down": ["Describe the mood or atmosphere of this scene.  Do not say anything else.", "Describing the mood or atmosphere of this scene."],
-    "left": ["How do you use this item/tool? Be direct and specific. Do not say anything else.", "Explaining how to use this item or tool."],
-    "right": ["Craft a creative story based on this image in under 100 words.", "Creating a story or scenario based on this image."], 
-    "select": ["Identify any text visible in this image. Do not say anything else.", "Listing any visible text in this image."],
-    "ok": ["What is the main subject or focus of this image?", "Describing the main subject or focus of this image."]
+    "shutter": ["Briefly describe this in 20 words or less.", "Providing a brief description of this image.", "medium"],
+    "up": ["What objects or items do you see in this image? List them. Do not say anything else.", "Listing the objects or items in this image.", "medium"],
+    "down": ["Describe the mood or atmosphere of this scene.  Do not say anything else.", "Describing the mood or atmosphere of this scene.", "low"],
+    "left": ["How do you use this item/tool? Be direct and specific. Do not say anything else.", "Explaining how to use this item or tool.", "medium"],
+    "right": ["Craft a creative story based on this image in under 100 words.", "Creating a story or scenario based on this image.", "medium"], 
+    "select": ["Identify any text visible in this image. Do not say anything else.", "Listing any visible text in this image.", "high"],
+    "ok": ["What is the main subject or focus of this image?", "Describing the main subject or focus of this image.", "low"]
 }
\ No newline at end of file
@@ -1,14 +1,35 @@
 import time
+import json
+import asyncio
 from adafruit_ble import BLERadio
 from adafruit_ble.services.nordic import UARTService
 from adafruit_ble.advertising.standard import ProvideServicesAdvertisement
 
+from constants import BLE_FRAMED_MESSAGES, BLE_SEND_TRACES, BLE_MIN_PACKET_SIZE, BLE_MAX_PACKET_SIZE
+from constants import BLE_PACKET_INTERVAL, BLE_TX_RETRIES, BLE_COMPRESS_MIN_BYTES
+from .framing import encode_frame, encode_line, decode_frame
+from .framing import FRAME_FLAG_TRACE, FRAME_FLAG_PARTIAL, FRAME_FLAG_DEFLATE, FRAME_FLAG_CAPABILITIES
+from .compress import deflate
+
 
 class BluetoothManager:
     """Handles Bluetooth LE communication"""
     
-    def __init__(self):
+    def __init__(self, framed=BLE_FRAMED_MESSAGES, send_traces=BLE_SEND_TRACES):
         print("Initializing Bluetooth...")
+        self.framed = framed
+        self.send_traces = send_traces
+        self.message_id = 0
+        # True while the parts of a streamed message are being sent
+        self.streaming = False
+        # Frame flags the receiver says it can decode, reset on disconnect
+        self.peer_flags = 0
+        self._rx = b""
+        # Totals since boot, and for the message currently being sent
+        self.tx_bytes = 0
+        self.tx_packets = 0
+        self.tx_retries = 0
+        self.message_tx = self._new_tx_stats()
         try:
             self.ble = BLERadio()
             self.uart = UARTService()
@@ -46,29 +67,175 @@ class BluetoothManager:
         print("BLE: Connected!")
         return True
     
-    def send_message(self, message):
-        """Send message over Bluetooth if connected"""
+    def _new_tx_stats(self):
+        return {"bytes": 0, "packets": 0, "retries": 0, "ms": 0}
+    
+    def encode_message(self, message, partial=False):
+        """Encode a message for the wire and return (message_id, bytes)"""
+        payload = message.encode('utf-8')
+        if not self.framed:
+            return None, encode_line(payload)
+        
+        # Every part of a streamed message shares the id of its first part
+        if not self.streaming:
+            self.message_id = (self.message_id + 1) & 0xFFFF
+            self.message_tx = self._new_tx_stats()
+        self.streaming = partial
+        
+        flags = FRAME_FLAG_PARTIAL if partial else 0
+        if (BLE_COMPRESS_MIN_BYTES and len(payload) >= BLE_COMPRESS_MIN_BYTES
+                and self.peer_flags & FRAME_FLAG_DEFLATE):
+            compressed = deflate(payload)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FRAME_FLAG_DEFLATE
+        return self.message_id, encode_frame(self.message_id, payload, flags)
+    
+    def packet_size(self):
+        """Bytes per notification: the connection's MTU less ATT overhead,
+        but no more than the UART TX characteristic holds"""
+        try:
+            size = self.ble.connections[0]._bleio_connection.max_packet_length
+        except (AttributeError, IndexError):
+            return BLE_MIN_PACKET_SIZE
+        size = max(BLE_MIN_PACKET_SIZE, min(size, BLE_MAX_PACKET_SIZE))
+        try:
+            # The characteristic refuses longer values with ValueError; its
+            # max_length is the StreamOut buffer_size, 64 by default
+            return min(size, self.uart._tx.bound_characteristic.max_length)
+        except AttributeError:
+            return size
+    
+    def _notify(self, packet):
+        # UARTService.write() always splits into 20 byte notifications;
+        # setting the characteristic directly sends one of up to the MTU
+        try:
+            characteristic = self.uart._tx.bound_characteristic
+        except AttributeError:
+            self.uart.write(packet)
+            return
+        characteristic.value = packet
+    
+    async def write(self, data):
+        """Send data as MTU-sized notifications, pacing them and retrying refusals"""
+        size = self.packet_size()
+        view = memoryview(data)
+        started = time.monotonic_ns()
+        packets = 0
+        retries = 0
+        
+        for offset in range(0, len(view), size):
+            attempt = 0
+            while True:
+                try:
+                    self._notify(view[offset:offset + size])
+                    break
+                except Exception as e:
+                    # The stack refuses notifications while its queue is full;
+                    # a ValueError means the packet itself is refused
+                    if isinstance(e, ValueError) or attempt >= BLE_TX_RETRIES or not self.ble.connected:
+                        if packets:
+                            # Part of the frame is out; the receiver would
+                            # wait for the rest, so make it start over
+                            self.disconnect()
+                        raise
+                    attempt += 1
+                    retries += 1
+                    await asyncio.sleep(BLE_PACKET_INTERVAL * (attempt + 1))
+            packets += 1
+            await asyncio.sleep(BLE_PACKET_INTERVAL)
+        
+        elapsed_ms = (time.monotonic_ns() - started) // 1000000
+        self.tx_bytes += len(data)
+        self.tx_packets += packets
+        self.tx_retries += retries
+        stats = self.message_tx
+        stats["bytes"] += len(data)
+        stats["packets"] += packets
+        stats["retries"] += retries
+        stats["ms"] += elapsed_ms
+        return packets, retries, elapsed_ms
+    
+    async def send_message(self, message, partial=False):
+        """Send message over Bluetooth if connected.
+        
+        partial=True sends one part of a streamed message; the next call
+        with partial=False completes it.
+        """
         if not self.ble:
             print("BLE not initialized")
             return False
             
         try:
             if self.ble.connected:
-                self.uart.write((message + "\n").encode('utf-8'))
-                print(f"BLE Sent: {message[:50]}...")
+                if not message and not (self.framed and self.streaming):
+                    return False
+                message_id, data = self.encode_message(message, partial)
+                packets, retries, elapsed_ms = await self.write(data)
+                rate = len(data) * 1000 // max(1, elapsed_ms)
+                print(f"BLE Sent #{message_id}: {len(data)} bytes in {packets} packets, "
+                      f"{elapsed_ms} ms ({rate} B/s), {retries} retries: {message[:50]}...")
                 return True
             else:
                 print("BLE: Not connected")
+                self.streaming = False
                 self.start_advertising()
                 return False
         except Exception as e:
             print(f"BLE Send Error: {e}")
+            self.streaming = False
             return False
     
+    async def send_trace(self, trace):
+        """Send a capture trace tagged with the id of the last message sent"""
+        if not (self.ble and self.framed and self.send_traces and self.message_id):
+            return False
+        
+        try:
+            if self.ble.connected:
+                trace.info["ble_tx"] = self.message_tx
+                payload = json.dumps(trace.to_dict()).encode('utf-8')
+                await self.write(encode_frame(self.message_id, payload, flags=FRAME_FLAG_TRACE))
+                return True
+            return False
+        except Exception as e:
+            print(f"BLE Trace Error: {e}")
+            return False
+    
+    def read_capabilities(self):
+        """Pick up the capabilities frame the receiver writes after connecting"""
+        waiting = self.uart.in_waiting
+        if not waiting:
+            return
+        self._rx += self.uart.read(waiting)
+        
+        while self._rx:
+            frame = decode_frame(self._rx)
+            if frame is None:
+                return
+            flags, _, payload, self._rx = frame
+            if flags & FRAME_FLAG_CAPABILITIES and payload:
+                self.peer_flags = payload[0]
+                print(f"BLE: Receiver decodes flags 0x{self.peer_flags:02x}")
+    
+    def disconnect(self):
+        """Drop the connection; the receiver clears its buffer and reconnects"""
+        self.streaming = False
+        for connection in self.ble.connections:
+            try:
+                connection.disconnect()
+            except Exception as e:
+                print(f"BLE Disconnect Error: {e}")
+        print("BLE: Disconnected after a partly sent message")
+    
     def check_connection(self):
         """Check and maintain BLE connection"""
         if self.ble:
             if not self.ble.connected:
+                self.peer_flags = 0
+                self._rx = b""
                 self.start_advertising()
+            else:
+                self.read_capabilities()
             return self.ble.connected
-        return False
\ No newline at end of file
+        return False
@@ -1,33 +1,54 @@
-import time
+import asyncio
+
+# (frequency in Hz, seconds); a frequency of 0 is a rest
+STARTUP = ((440, 0.1), (554, 0.1), (659, 0.1), (880, 0.3))
+BUTTON_PRESS = ((1000, 0.05),)
+SUCCESS = ((1000, 0.05), (0, 0.05), (1200, 0.05), (0, 0.05), (1000, 0.05))
+BLUETOOTH = ((800, 0.05), (0, 0.05), (800, 0.05))
+ERROR = ((400, 0.3),)
+
 
 class BuzzerManager:
-    """Handles buzzer sounds using PyCamera's built-in methods"""
-    
+    """Handles buzzer sounds using PyCamera's built-in methods.
+
+    The play_* methods only queue a pattern; the run() task plays it, resting
+    between tones with asyncio so the rest of the firmware keeps running.
+    """
+
     def __init__(self, pycam):
         self.pycam = pycam
+        self._patterns = []
+        self._ready = asyncio.Event()
+
+    def play(self, pattern):
+        self._patterns.append(pattern)
+        self._ready.set()
 
     def play_startup_beep(self):
-        self.pycam.tone(440, 0.1)
-        self.pycam.tone(554, 0.1)
-        self.pycam.tone(659, 0.1)
-        self.pycam.tone(880, 0.3)
-        time.sleep(1)
-        
+        self.play(STARTUP)
+
     def play_button_press(self):
-        self.pycam.tone(1000, 0.05)
-        time.sleep(0.05)
+        self.play(BUTTON_PRESS)
 
     def play_success_beep(self):
-        self.pycam.tone(1000, 0.05)
-        time.sleep(0.05)
-        self.pycam.tone(1200, 0.05)
-        time.sleep(0.05)
-        self.pycam.tone(1000, 0.05)
-    
+        self.play(SUCCESS)
+
     def play_bluetooth_beep(self):
-        self.pycam.tone(800, 0.05)
-        time.sleep(0.05)
-        self.pycam.tone(800, 0.05)
-            
+        self.play(BLUETOOTH)
+
     def play_error_beep(self):
-        self.pycam.tone(400, 0.3)
\ No newline at end of file
+        self.play(ERROR)
+
+    async def run(self):
+        while True:
+            await self._ready.wait()
+            self._ready.clear()
+
+            while self._patterns:
+                for frequency, duration in self._patterns.pop(0):
+                    if frequency:
+                        # tone() blocks for its duration; tones are kept short
+                        self.pycam.tone(frequency, duration)
+                        await asyncio.sleep(0)
+                    else:
+                        await asyncio.sleep(duration)
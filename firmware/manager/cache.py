@@ -0,0 +1,116 @@
+import json
+import time
+
+
+def average_hash(bitmap, size=8):
+    """64-bit average hash of an RGB565 preview frame.
+
+    The frame is split into size x size cells, each sampled at four points;
+    a bit is set where the cell is brighter than the frame's mean.
+    """
+    cell_w = bitmap.width // size
+    cell_h = bitmap.height // size
+    offsets = ((cell_w // 4, cell_h // 4), (3 * cell_w // 4, cell_h // 4),
+               (cell_w // 4, 3 * cell_h // 4), (3 * cell_w // 4, 3 * cell_h // 4))
+
+    cells = []
+    for row in range(size):
+        for col in range(size):
+            total = 0
+            for dx, dy in offsets:
+                pixel = bitmap[col * cell_w + dx, row * cell_h + dy]
+                # Frames hold big-endian RGB565, as sent to the display
+                pixel = ((pixel & 0xFF) << 8) | (pixel >> 8)
+                total += ((pixel >> 11) & 0x1F) * 2 + ((pixel >> 5) & 0x3F) + (pixel & 0x1F) * 2
+            cells.append(total)
+
+    mean = sum(cells) // len(cells)
+    value = 0
+    for total in cells:
+        value = (value << 1) | (1 if total > mean else 0)
+    return value
+
+
+def hamming(a, b):
+    x = a ^ b
+    count = 0
+    while x:
+        x &= x - 1
+        count += 1
+    return count
+
+
+class ResponseCache:
+    """Recent Gemini answers keyed by prompt mode and a perceptual frame hash.
+
+    A lookup matches the most similar entry for the mode within max_distance
+    bits and ttl seconds. Entries are kept least recently used first. With a
+    path, the cache is also saved as JSON, e.g. on the SD card; entries use
+    time.time(), so saved ones only outlive a reboot if the clock is set.
+    """
+
+    def __init__(self, max_entries, ttl, max_distance, path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        # [frame hash, mode, text, time stored]
+        self.entries = []
+        self._load()
+
+    def _expired(self, entry, now):
+        age = now - entry[3]
+        return age < 0 or age > self.ttl
+
+    def lookup(self, frame_hash, mode):
+        """Return the cached answer for a near-identical frame, or None"""
+        now = time.time()
+        self.entries = [entry for entry in self.entries if not self._expired(entry, now)]
+
+        best = None
+        best_distance = self.max_distance + 1
+        for entry in self.entries:
+            if entry[1] != mode:
+                continue
+            distance = hamming(entry[0], frame_hash)
+            if distance < best_distance:
+                best = entry
+                best_distance = distance
+
+        if best is None:
+            self.misses += 1
+            return None
+
+        self.entries.remove(best)
+        self.entries.append(best)
+        self.hits += 1
+        print(f"Response cache hit: {mode}, {best_distance} bits apart")
+        return best[2]
+
+    def store(self, frame_hash, mode, text):
+        self.entries.append([frame_hash, mode, text, time.time()])
+        while len(self.entries) > self.max_entries:
+            self.entries.pop(0)
+        self._save()
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                self.entries = json.load(f)[-self.max_entries:]
+            print(f"Loaded {len(self.entries)} cached responses from {self.path}")
+        except (OSError, ValueError) as e:
+            print(f"No response cache loaded: {e}")
+
+    def _save(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "w") as f:
+                json.dump(self.entries, f)
+        except OSError as e:
+            # No SD card, or the filesystem is read-only
+            print(f"Response cache not saved: {e}")
@@ -0,0 +1,114 @@
+"""
+Raw DEFLATE (RFC 1951) compression for BLE payloads.
+
+CircuitPython's zlib can only decompress, so this is a small encoder: greedy
+LZ77 matching with fixed Huffman codes in a single block. The receiver
+inflates it with zlib.decompress(data, -15).
+"""
+
+_LENGTH_BASE = (3, 4, 5, 6, 7, 8, 9, 10, 11, 13, 15, 17, 19, 23, 27, 31,
+                35, 43, 51, 59, 67, 83, 99, 115, 131, 163, 195, 227, 258)
+_LENGTH_EXTRA = (0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2,
+                 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 5, 0)
+_DISTANCE_BASE = (1, 2, 3, 4, 5, 7, 9, 13, 17, 25, 33, 49, 65, 97, 129, 193,
+                  257, 385, 513, 769, 1025, 1537, 2049, 3073, 4097, 6145,
+                  8193, 12289, 16385, 24577)
+_DISTANCE_EXTRA = (0, 0, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 5, 5, 6, 6,
+                   7, 7, 8, 8, 9, 9, 10, 10, 11, 11, 12, 12, 13, 13)
+
+_MIN_MATCH = 3
+_MAX_MATCH = 258
+_WINDOW = 32768
+
+
+class _BitWriter:
+    """Packs values least significant bit first, as DEFLATE expects"""
+
+    def __init__(self):
+        self.out = bytearray()
+        self.acc = 0
+        self.bits = 0
+
+    def write(self, value, count):
+        self.acc |= value << self.bits
+        self.bits += count
+        while self.bits >= 8:
+            self.out.append(self.acc & 0xFF)
+            self.acc >>= 8
+            self.bits -= 8
+
+    def write_code(self, code, length):
+        # Huffman codes are stored most significant bit first
+        reversed_code = 0
+        for _ in range(length):
+            reversed_code = (reversed_code << 1) | (code & 1)
+            code >>= 1
+        self.write(reversed_code, length)
+
+    def finish(self):
+        if self.bits:
+            self.out.append(self.acc & 0xFF)
+        return bytes(self.out)
+
+
+def _write_symbol(writer, symbol):
+    """Fixed Huffman code for a literal/length symbol"""
+    if symbol < 144:
+        writer.write_code(0x30 + symbol, 8)
+    elif symbol < 256:
+        writer.write_code(0x190 + symbol - 144, 9)
+    elif symbol < 280:
+        writer.write_code(symbol - 256, 7)
+    else:
+        writer.write_code(0xC0 + symbol - 280, 8)
+
+
+def _code_for(bases, value):
+    code = len(bases) - 1
+    while bases[code] > value:
+        code -= 1
+    return code
+
+
+def deflate(data):
+    """Compress bytes into a raw DEFLATE stream"""
+    writer = _BitWriter()
+    # Final block, fixed Huffman codes
+    writer.write(1, 1)
+    writer.write(1, 2)
+
+    last_seen = {}
+    size = len(data)
+    i = 0
+    while i < size:
+        length = 0
+        if i + _MIN_MATCH <= size:
+            key = data[i:i + _MIN_MATCH]
+            candidate = last_seen.get(key)
+            last_seen[key] = i
+            if candidate is not None and i - candidate <= _WINDOW:
+                limit = min(_MAX_MATCH, size - i)
+                length = _MIN_MATCH
+                while length < limit and data[candidate + length] == data[i + length]:
+                    length += 1
+
+        if length < _MIN_MATCH:
+            _write_symbol(writer, data[i])
+            i += 1
+            continue
+
+        code = _code_for(_LENGTH_BASE, length)
+        _write_symbol(writer, 257 + code)
+        writer.write(length - _LENGTH_BASE[code], _LENGTH_EXTRA[code])
+
+        distance = i - candidate
+        code = _code_for(_DISTANCE_BASE, distance)
+        writer.write_code(code, 5)
+        writer.write(distance - _DISTANCE_BASE[code], _DISTANCE_EXTRA[code])
+
+        for j in range(i + 1, min(i + length, size - _MIN_MATCH + 1)):
+            last_seen[data[j:j + _MIN_MATCH]] = j
+        i += length
+
+    _write_symbol(writer, 256)
+    return writer.finish()
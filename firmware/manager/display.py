@@ -0,0 +1,106 @@
+import displayio
+import terminalio
+from adafruit_display_text import label
+
+
+def wrap_text(text, max_chars_per_line):
+    """Greedy word wrap; explicit line breaks count as spaces"""
+    lines = []
+    current_line = ""
+
+    for word in text.split():
+        test_line = current_line + " " + word if current_line else word
+        if len(test_line) <= max_chars_per_line:
+            current_line = test_line
+        else:
+            if current_line:
+                lines.append(current_line)
+            current_line = word
+
+    if current_line:
+        lines.append(current_line)
+
+    return "\n".join(lines)
+
+
+class DisplayManager:
+    """Full-screen text on a scene built once and updated in place.
+
+    The background, its palette and the label live for the whole run; a new
+    message only changes the label's text, color and scale, so showing text
+    allocates nothing but the wrapped string. Wrapped short strings are kept,
+    up to wrap_cache_entries and never evicted, so status banners wrap once.
+    """
+
+    def __init__(self, display, wrap_cache_entries=0, wrap_cache_max_chars=0):
+        self.display = display
+        self.wrap_cache_entries = wrap_cache_entries
+        self.wrap_cache_max_chars = wrap_cache_max_chars
+        # (text, max chars per line) -> wrapped text
+        self._wrapped = {}
+
+        self._background = displayio.Bitmap(display.width, display.height, 1)
+        self._palette = displayio.Palette(1)
+        self._palette[0] = 0x000000
+        self._label = label.Label(
+            terminalio.FONT,
+            text="",
+            color=0xFFFFFF,
+            scale=2,
+            anchor_point=(0.5, 0.5),
+            anchored_position=(display.width // 2, display.height // 2)
+        )
+        self._image = None
+
+        self.group = displayio.Group()
+        self.group.append(displayio.TileGrid(self._background, pixel_shader=self._palette, x=0, y=0))
+        self.group.append(self._label)
+
+    def wrap(self, text, max_chars_per_line):
+        key = (text, max_chars_per_line)
+        wrapped = self._wrapped.get(key)
+        if wrapped is None:
+            wrapped = wrap_text(text, max_chars_per_line)
+            if len(text) <= self.wrap_cache_max_chars and len(self._wrapped) < self.wrap_cache_entries:
+                self._wrapped[key] = wrapped
+        return wrapped
+
+    def show_text(self, text, bg_color=0x000000, text_color=0xFFFFFF, scale=2, max_chars_per_line=20):
+        """Display wrapped text centered on a plain background"""
+        self._remove_image()
+        if self._palette[0] != bg_color:
+            self._palette[0] = bg_color
+        if self._label.scale != scale:
+            self._label.scale = scale
+        if self._label.color != text_color:
+            self._label.color = text_color
+        wrapped = self.wrap(text, max_chars_per_line)
+        if self._label.text != wrapped:
+            self._label.text = wrapped
+        self._redraw()
+
+    def show_image(self, bitmap, palette):
+        """Display a bitmap centered on the background, e.g. a splash screen"""
+        self._remove_image()
+        self._label.text = ""
+        self._image = displayio.TileGrid(
+            bitmap,
+            pixel_shader=palette,
+            x=(self.display.width - bitmap.width) // 2,
+            y=(self.display.height - bitmap.height) // 2
+        )
+        self.group.insert(1, self._image)
+        self._redraw()
+
+    def _remove_image(self):
+        if self._image is not None:
+            self.group.remove(self._image)
+            self._image = None
+
+    def _redraw(self):
+        if self.display.root_group is not self.group:
+            self.display.root_group = self.group
+        # The camera preview is blitted straight to the panel behind
+        # displayio's back, so the whole scene has to be sent again
+        self._background.dirty()
+        self.display.refresh()
@@ -0,0 +1,46 @@
+import struct
+
+# Wire format shared with bt-receiver/framing.py: STX, flags, message id,
+# payload length, then the UTF-8 payload. Keep the two in sync.
+FRAME_START = 0x02
+FRAME_HEADER_FORMAT = ">BBHH"
+
+# Payload is a JSON capture trace for the message with the same id
+FRAME_FLAG_TRACE = 0x01
+# More parts of this message id follow; the last part clears the flag
+FRAME_FLAG_PARTIAL = 0x02
+# Payload is raw DEFLATE; only sent once the receiver has announced support
+FRAME_FLAG_DEFLATE = 0x04
+# Receiver to camera: the payload's first byte is the flags it can decode
+FRAME_FLAG_CAPABILITIES = 0x08
+
+
+def encode_frame(message_id, payload, flags=0):
+    """Prefix an encoded payload with a frame header"""
+    header = struct.pack(FRAME_HEADER_FORMAT, FRAME_START, flags, message_id & 0xFFFF, len(payload))
+    return header + payload
+
+
+def encode_line(payload):
+    """Legacy newline-terminated encoding"""
+    return payload + b"\n"
+
+
+def decode_frame(data):
+    """Split one frame off the front of data.
+    
+    Returns (flags, message_id, payload, rest), or None until the whole frame
+    has arrived. Bytes before a frame start are skipped.
+    """
+    start = 0
+    while start < len(data) and data[start] != FRAME_START:
+        start += 1
+    data = data[start:]
+    
+    size = struct.calcsize(FRAME_HEADER_FORMAT)
+    if len(data) < size:
+        return None
+    _, flags, message_id, length = struct.unpack_from(FRAME_HEADER_FORMAT, data)
+    if len(data) < size + length:
+        return None
+    return flags, message_id, data[size:size + length], data[size + length:]
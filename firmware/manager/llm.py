@@ -1,59 +1,499 @@
 import os
+import json
+import time
+import errno
+import asyncio
 import binascii
-from constants import GEMINI_MODEL, GEMINI_PROMPT
+import adafruit_requests
+import adafruit_connection_manager
+from constants import GEMINI_MODEL, GEMINI_PROMPT, UPLOAD_CHUNK_SIZE, GEMINI_STREAM_RESPONSES, STREAM_MIN_SENTENCE_CHARS
+from constants import GEMINI_TIMEOUT, GEMINI_IDLE_TIMEOUT
+from .wifi import WiFiManager
+
+GEMINI_HOST = "generativelanguage.googleapis.com"
+GEMINI_PORT = 443
+
+# The request body around each base64 image and the JSON-encoded prompt
+_BODY_START = b'{"contents":[{"parts":['
+_IMAGE_START = b'{"inline_data":{"mime_type":"image/jpeg","data":"'
+_IMAGE_END = b'"}},'
+_BODY_PROMPT = b'{"text":'
+_BODY_END = b'}]}]'
+
+# Put before the per-image prompts of a batched request
+BATCH_PROMPT = ("Answer one question about each of these {count} images, in order. "
+                "Reply with a JSON array of {count} strings, one answer per image.\n")
+
+# Bytes taken off the socket per wait for the response
+_RECEIVE_SIZE = 512
+# What a non-blocking read raises when nothing has arrived yet
+_WOULD_BLOCK = (errno.EAGAIN, errno.ETIMEDOUT)
+
+
+async def _receive(sock, size=_RECEIVE_SIZE, timeout=GEMINI_TIMEOUT):
+    """Wait for the next bytes on a socket, letting other tasks run meanwhile.
+    
+    Returns what arrived, or nothing once the server has closed the socket.
+    """
+    buffer = bytearray(size)
+    deadline = time.monotonic() + timeout
+    sock.settimeout(0)
+    try:
+        while True:
+            try:
+                count = sock.recv_into(buffer)
+                return memoryview(buffer)[:count]
+            except OSError as e:
+                if e.errno not in _WOULD_BLOCK:
+                    raise
+            if time.monotonic() > deadline:
+                raise OSError(errno.ETIMEDOUT, "timed out")
+            await asyncio.sleep(0)
+    finally:
+        sock.settimeout(GEMINI_TIMEOUT)
+
+
+class StreamedResponse(adafruit_requests.Response):
+    """A Response whose reads start with bytes already awaited with _receive().
+    
+    adafruit_requests only reads blocking. Awaiting readable() before each
+    read means that read finds its bytes waiting instead of stalling the
+    event loop while Gemini thinks.
+    """
+    
+    def __init__(self, sock, session, method, received):
+        self._received = received
+        super().__init__(sock, session, method)
+    
+    def _recv_into(self, buf, size=0):
+        if self._received:
+            count = min(size or len(buf), len(self._received))
+            buf[:count] = self._received[:count]
+            self._received = self._received[count:]
+            return count
+        return super()._recv_into(buf, size)
+    
+    async def readable(self):
+        """Wait until the next read will not block"""
+        # _received_length is what adafruit_requests itself has buffered
+        if self._received or self._received_length or not self.socket:
+            return
+        if self._remaining == 0 and not self._chunked:
+            # The body has been read to its Content-Length
+            return
+        self._received = await _receive(self.socket)
 
 class LLMManager:
     """Handles LLM API interactions"""
     
-    def __init__(self, requests_session):
+    def __init__(self, requests_session, pool=None, ssl_context=None):
         self.requests = requests_session
         self.api_key = os.getenv("GEMINI_API_KEY")
+        self.pool = pool
+        self.ssl_context = ssl_context
+        # Streaming upload needs direct socket access; without it fall back
+        # to building the whole JSON body in memory.
+        self.streaming_upload = pool is not None and UPLOAD_CHUNK_SIZE > 0
+        # Why the last call returned no description, or None; network errors
+        # are the ones worth retrying later
+        self.last_error = None
+        self.network_error = False
+        # Whether the last request failed before it could reach Gemini
+        self.unreachable = False
+        # Whether a pooled connection to Gemini is believed to be open, when
+        # it was last used, and what opening it cost
+        self.connected = False
+        self.last_used = 0
+        self.dns_ms = None
+        self.handshake_ms = None
+    
+    def _path(self, stream=False):
+        if stream:
+            return f"/v1beta/models/{GEMINI_MODEL}:streamGenerateContent?alt=sse"
+        return f"/v1beta/models/{GEMINI_MODEL}:generateContent"
     
     def _encode_image(self, jpeg_data):
         print("Encoding image...")
         return binascii.b2a_base64(jpeg_data).strip().decode()
     
-    def _build_payload(self, b64_image, prompt):
-        return {
-            "contents": [{
-                "parts": [
-                    {
-                        "inline_data": {
-                            "mime_type": "image/jpeg",
-                            "data": b64_image
-                        }
-                    },
-                    {"text": prompt}
-                ]
-            }]
-        }
+    def _build_payload(self, b64_images, prompt, config=None):
+        parts = [{"inline_data": {"mime_type": "image/jpeg", "data": b64}} for b64 in b64_images]
+        parts.append({"text": prompt})
+        payload = {"contents": [{"parts": parts}]}
+        if config:
+            payload["generationConfig"] = config
+        return payload
     
-    def analyze_image(self, jpeg_data, prompt=GEMINI_PROMPT):
-        if not self.api_key:
-            return "Error: No API Key in settings.toml"
-        
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL}:generateContent"
-        
-        b64_image = self._encode_image(jpeg_data)
-        payload = self._build_payload(b64_image, prompt)
+    def _post_buffered(self, images, prompt, trace=None, stream=False, config=None):
+        """Encode the whole images, then POST the JSON body in one go"""
+        b64_images = [self._encode_image(jpeg_data) for jpeg_data in images]
+        payload = self._build_payload(b64_images, prompt, config)
+        if trace:
+            trace.mark("encode")
         headers = {
             "x-goog-api-key": self.api_key,
             "Content-Type": "application/json"
         }
         
+        if self.pool is not None:
+            # Connect first, so a failure to do so is told apart from one
+            # during the request; the request reuses the socket
+            manager = adafruit_connection_manager.get_connection_manager(self.pool)
+            manager.free_socket(self._open_socket(manager))
+        
         print("Sending to Gemini...")
+        return self.requests.post(f"https://{GEMINI_HOST}{self._path(stream)}", json=payload, headers=headers, stream=stream)
+    
+    def _send_all(self, sock, data):
+        view = memoryview(data)
+        sent = 0
+        while sent < len(view):
+            count = sock.send(view[sent:])
+            if count is None:
+                count = len(view) - sent
+            sent += count
+    
+    async def _post_streamed(self, images, prompt, trace=None, stream=False, config=None):
+        """POST the JSON body while base64-encoding the images chunk by chunk.
+        
+        Extra memory is bounded by UPLOAD_CHUNK_SIZE instead of holding the
+        base64 copy, its decoded string and the serialized JSON at once.
+        Other tasks run between chunks.
+        """
+        suffix = _BODY_PROMPT + json.dumps(prompt).encode('utf-8') + _BODY_END
+        if config:
+            suffix += b',"generationConfig":' + json.dumps(config).encode('utf-8')
+        suffix += b'}'
+        content_length = len(_BODY_START) + len(suffix)
+        for jpeg_data in images:
+            content_length += len(_IMAGE_START) + (len(jpeg_data) + 2) // 3 * 4 + len(_IMAGE_END)
+        
+        header = (
+            f"POST {self._path(stream)} HTTP/1.1\r\n"
+            f"Host: {GEMINI_HOST}\r\n"
+            f"x-goog-api-key: {self.api_key}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {content_length}\r\n"
+            "\r\n"
+        ).encode('utf-8')
+        
+        manager = adafruit_connection_manager.get_connection_manager(self.pool)
+        for attempt in range(2):
+            # Reuses the socket left open by warm_up() or the last request
+            sock = self._open_socket(manager)
+            try:
+                # A pooled socket keeps the timeout it was opened with
+                sock.settimeout(GEMINI_TIMEOUT)
+                self._send_all(sock, header)
+                break
+            except OSError:
+                # A pooled socket the server has closed since; open a new one
+                self._close_socket(manager, sock)
+                if attempt:
+                    raise
+        if trace:
+            trace.mark("connect")
+        
+        try:
+            print(f"Streaming {sum(len(jpeg_data) for jpeg_data in images)} bytes to Gemini...")
+            self._send_all(sock, _BODY_START)
+            
+            # A multiple of 3 keeps padding out of every chunk but the last
+            chunk_size = max(3, UPLOAD_CHUNK_SIZE - UPLOAD_CHUNK_SIZE % 3)
+            for jpeg_data in images:
+                self._send_all(sock, _IMAGE_START)
+                image = memoryview(jpeg_data)
+                for offset in range(0, len(image), chunk_size):
+                    encoded = binascii.b2a_base64(image[offset:offset + chunk_size])
+                    # Drop the trailing newline without copying
+                    self._send_all(sock, memoryview(encoded)[:-1])
+                    await asyncio.sleep(0)
+                self._send_all(sock, _IMAGE_END)
+            
+            self._send_all(sock, suffix)
+            if trace:
+                trace.mark("upload")
+            # Gemini's first byte can take seconds; wait for it as a task
+            received = await _receive(sock)
+            return StreamedResponse(sock, self.requests, "POST", received)
+        except BaseException:
+            # Includes cancellation of the request and a response that timed
+            # out; a socket left in the pool would block every later request
+            self._close_socket(manager, sock)
+            raise
+    
+    def _open_socket(self, manager, timeout=GEMINI_TIMEOUT):
+        """Get the pooled Gemini socket, connecting it if there is none.
+        
+        Failing to resolve or connect means Gemini is unreachable from here;
+        anything after that is a failed request.
+        """
+        for attempt in range(2):
+            try:
+                return manager.get_socket(GEMINI_HOST, GEMINI_PORT, "https:", timeout=timeout,
+                                          ssl_context=self.ssl_context)
+            except OSError:
+                self.unreachable = True
+                raise
+            except RuntimeError:
+                # A socket an earlier failure left registered as in use
+                if attempt:
+                    raise
+                self._release()
+    
+    def _release(self):
+        """Close every pooled socket, so the next request connects afresh"""
+        self.connected = False
+        if self.pool is not None:
+            adafruit_connection_manager.connection_manager_close_all(self.pool)
+    
+    def _close_socket(self, manager, sock):
+        """Close a pooled socket and forget it, unless that already happened"""
+        try:
+            manager.close_socket(sock)
+        except RuntimeError:
+            # Not managed any more: adafruit_requests closed it itself
+            pass
+    
+    def _discard(self, response):
+        """Close a half-read response's socket instead of returning it to the pool"""
+        if self.pool is not None and response.socket:
+            adafruit_connection_manager.get_connection_manager(self.pool).close_socket(response.socket)
+            response.socket = None
+    
+    def _candidate_text(self, json_resp):
+        try:
+            return json_resp["candidates"][0]["content"]["parts"][0]["text"]
+        except (KeyError, IndexError):
+            return None
+    
+    def _split_sentences(self, text):
+        """Split text into (complete sentences, unfinished remainder)"""
+        cut = 0
+        for i in range(len(text) - 1):
+            if text[i] in ".!?\n" and text[i + 1] in " \n":
+                cut = i + 1
+        if cut < STREAM_MIN_SENTENCE_CHARS:
+            return "", text
+        return text[:cut].strip(), text[cut:]
+    
+    async def _read_stream(self, response, on_text, trace=None):
+        """Parse server-sent events, forwarding complete sentences as they arrive"""
+        buffer = b""
+        parts = []
+        pending = ""
+        
+        chunks = response.iter_content(chunk_size=256)
+        while True:
+            if isinstance(response, StreamedResponse):
+                await response.readable()
+            chunk = next(chunks, None)
+            if chunk is None:
+                break
+            buffer += chunk
+            end = buffer.find(b"\n")
+            while end >= 0:
+                line = buffer[:end].strip()
+                buffer = buffer[end + 1:]
+                end = buffer.find(b"\n")
+                
+                if not line.startswith(b"data:"):
+                    continue
+                text = self._candidate_text(json.loads(line[5:]))
+                if not text:
+                    continue
+                
+                if trace and not parts:
+                    trace.mark("llm_first")
+                parts.append(text)
+                
+                sentences, pending = self._split_sentences(pending + text)
+                if sentences:
+                    on_text(sentences, False)
+            await asyncio.sleep(0)
+        
+        on_text(pending.strip(), True)
+        return "".join(parts)
+    
+    def warm_up(self):
+        """Resolve the Gemini host and open a TLS connection for the next request.
+        
+        Blocks for the DNS lookup and the handshake, at most
+        GEMINI_IDLE_TIMEOUT each.
+        """
+        if self.pool is None:
+            return False
+        started = time.monotonic_ns()
+        try:
+            self.pool.getaddrinfo(GEMINI_HOST, GEMINI_PORT)
+            resolved = time.monotonic_ns()
+            manager = adafruit_connection_manager.get_connection_manager(self.pool)
+            sock = self._open_socket(manager, GEMINI_IDLE_TIMEOUT)
+            # Back to the pool, still connected, for the next request to reuse;
+            # adafruit_requests keeps whatever timeout the socket has
+            sock.settimeout(GEMINI_TIMEOUT)
+            manager.free_socket(sock)
+        except Exception as e:
+            print(f"Gemini warm-up failed: {e}")
+            self._release()
+            return False
+        
+        self.dns_ms = (resolved - started) // 1000000
+        self.handshake_ms = (time.monotonic_ns() - resolved) // 1000000
+        print(f"Gemini connection ready: DNS {self.dns_ms} ms, TLS handshake {self.handshake_ms} ms")
+        self.connected = True
+        self.last_used = time.monotonic()
+        return True
+    
+    async def keep_alive(self):
+        """Make a tiny request on the pooled connection so it is not closed as idle.
+        
+        Only sending the request blocks; the response is awaited like a
+        Gemini answer, for at most GEMINI_IDLE_TIMEOUT.
+        """
+        if self.pool is None:
+            return False
+        request = (
+            f"GET /v1beta/models/{GEMINI_MODEL} HTTP/1.1\r\n"
+            f"Host: {GEMINI_HOST}\r\n"
+            f"x-goog-api-key: {self.api_key}\r\n"
+            "\r\n"
+        ).encode('utf-8')
+        manager = adafruit_connection_manager.get_connection_manager(self.pool)
+        try:
+            started = time.monotonic_ns()
+            # The socket warm_up() or the last request left in the pool
+            sock = self._open_socket(manager, GEMINI_IDLE_TIMEOUT)
+            try:
+                sock.settimeout(GEMINI_TIMEOUT)
+                self._send_all(sock, request)
+                received = await _receive(sock, timeout=GEMINI_IDLE_TIMEOUT)
+                if not received:
+                    raise OSError(errno.ECONNRESET, "closed by Gemini")
+                response = StreamedResponse(sock, self.requests, "GET", received)
+                # Read the whole body so the socket can be reused
+                chunks = response.iter_content(chunk_size=256)
+                while True:
+                    await response.readable()
+                    if next(chunks, None) is None:
+                        break
+            except BaseException:
+                self._close_socket(manager, sock)
+                raise
+        except Exception as e:
+            # Only this socket: a press during the wait may have opened another
+            print(f"Gemini keep-alive failed: {e}")
+            self.connected = False
+            return False
+        
+        print(f"Gemini keep-alive: {(time.monotonic_ns() - started) // 1000000} ms")
+        self.last_used = time.monotonic()
+        return True
+    
+    async def _post(self, images, prompt, trace=None, stream=False, config=None):
+        if self.streaming_upload:
+            return await self._post_streamed(images, prompt, trace, stream, config)
+        return self._post_buffered(images, prompt, trace, stream, config)
+    
+    def _fail(self, e, trace=None):
+        if trace:
+            trace.mark("llm")
+        error_msg = str(e)[:40]
+        print(f"API Error: {error_msg}")
+        if isinstance(e, (OSError, RuntimeError, adafruit_requests.OutOfRetries)):
+            # Whatever the failure left in the pool would block the retry
+            self._release()
+        # Only an outage is worth retrying once the network is back; a
+        # request that timed out would most likely time out again
+        self.network_error = self.unreachable or not WiFiManager.connected()
+        self.last_error = f"API Error: {error_msg}"
+        return self.last_error
+    
+    async def analyze_image(self, jpeg_data, prompt=GEMINI_PROMPT, trace=None, on_text=None):
+        """Describe an image with Gemini.
+        
+        With on_text and GEMINI_STREAM_RESPONSES, the response is streamed and
+        on_text(text, final) receives complete sentences while the model is
+        still generating; the final call carries the remainder, possibly empty.
+        Connecting still blocks, and so does all of the request without
+        streaming upload (UPLOAD_CHUNK_SIZE = 0).
+        """
+        self.last_error = None
+        self.network_error = False
+        self.unreachable = False
+        if not self.api_key:
+            self.last_error = "Error: No API Key in settings.toml"
+            return self.last_error
+        
+        stream = on_text is not None and GEMINI_STREAM_RESPONSES
+        
         try:
-            response = self.requests.post(url, json=payload, headers=headers)
-            json_resp = response.json()
+            response = await self._post([jpeg_data], prompt, trace, stream)
+            
+            try:
+                if stream:
+                    text = await self._read_stream(response, on_text, trace)
+                else:
+                    json_resp = response.json()
+                    text = self._candidate_text(json_resp)
+                    if text is None:
+                        print(json_resp)
+            except BaseException:
+                self._discard(response)
+                raise
+            finally:
+                response.close()
             
-            if "candidates" in json_resp:
-                text = json_resp["candidates"][0]["content"]["parts"][0]["text"]
+            if trace:
+                trace.mark("llm")
+            self.connected = True
+            self.last_used = time.monotonic()
+            
+            if text and text.strip():
                 return text.strip()
             else:
-                print(json_resp)
-                return "No content returned."
+                self.last_error = "No content returned."
+                return self.last_error
                 
         except Exception as e:
-            error_msg = str(e)[:40]
-            print(f"API Error: {error_msg}")
-            return f"API Error: {error_msg}"
\ No newline at end of file
+            return self._fail(e, trace)
+    
+    async def analyze_batch(self, images, prompts):
+        """Ask about several images in one request.
+        
+        Returns one answer per image, or None with last_error set.
+        """
+        if len(images) == 1:
+            text = await self.analyze_image(images[0], prompts[0])
+            return None if self.last_error else [text]
+        
+        self.last_error = None
+        self.network_error = False
+        self.unreachable = False
+        if not self.api_key:
+            self.last_error = "Error: No API Key in settings.toml"
+            return None
+        
+        prompt = BATCH_PROMPT.format(count=len(images))
+        prompt += "\n".join(f"Image {i + 1}: {question}" for i, question in enumerate(prompts))
+        
+        try:
+            response = await self._post(images, prompt, config={"responseMimeType": "application/json"})
+            try:
+                json_resp = response.json()
+            except BaseException:
+                self._discard(response)
+                raise
+            finally:
+                response.close()
+            
+            answers = json.loads(self._candidate_text(json_resp) or "null")
+            if isinstance(answers, list) and len(answers) == len(images):
+                return [str(answer).strip() for answer in answers]
+            print(json_resp)
+            self.last_error = "Batch answers did not match the images."
+            return None
+        
+        except Exception as e:
+            self._fail(e)
+            return None
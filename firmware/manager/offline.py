@@ -0,0 +1,69 @@
+import os
+import json
+import time
+
+
+def clock_is_set():
+    """The RTC starts at 2000-01-01 until it is set over NTP"""
+    return time.localtime()[0] >= 2024
+
+
+class CaptureQueue:
+    """Captures waiting for the network, kept as numbered JPEG and JSON pairs.
+    
+    The JSON file is written last, so a capture interrupted by a power cut
+    is never picked up half written.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        self.available = self._prepare()
+    
+    def _prepare(self):
+        try:
+            os.stat(self.directory)
+            return True
+        except OSError:
+            pass
+        try:
+            os.mkdir(self.directory)
+            return True
+        except OSError as e:
+            # No SD card mounted
+            print(f"Offline queue unavailable: {e}")
+            return False
+    
+    def _path(self, name, extension):
+        return f"{self.directory}/{name}.{extension}"
+    
+    def names(self):
+        """Queued captures, oldest first"""
+        if not self.available:
+            return []
+        return sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith(".json"))
+    
+    def add(self, jpeg_data, mode):
+        names = self.names()
+        name = f"{int(names[-1]) + 1 if names else 1:06d}"
+        meta = {"mode": mode, "time": time.time(), "clock_set": clock_is_set()}
+        
+        with open(self._path(name, "jpg"), "wb") as f:
+            f.write(jpeg_data)
+        with open(self._path(name, "json"), "w") as f:
+            json.dump(meta, f)
+        print(f"Queued capture {name} ({mode}) for later")
+        return name
+    
+    def load(self, name):
+        """Return (jpeg bytes, metadata) of a queued capture"""
+        with open(self._path(name, "json"), "r") as f:
+            meta = json.load(f)
+        with open(self._path(name, "jpg"), "rb") as f:
+            return f.read(), meta
+    
+    def remove(self, name):
+        for extension in ("json", "jpg"):
+            try:
+                os.remove(self._path(name, extension))
+            except OSError:
+                pass
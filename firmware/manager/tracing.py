@@ -0,0 +1,28 @@
+import time
+
+
+class CaptureTrace:
+    """Per-capture stage timings taken with time.monotonic_ns"""
+    
+    def __init__(self, capture_id, mode):
+        self.capture_id = capture_id
+        self.mode = mode
+        self.stages = {}
+        self.info = {}
+        self.started = time.monotonic_ns()
+        self._last = self.started
+    
+    def mark(self, stage):
+        """Record the time since the previous mark as the given stage"""
+        now = time.monotonic_ns()
+        self.stages[stage] = (now - self._last) // 1000000
+        self._last = now
+    
+    def to_dict(self):
+        return {
+            "capture": self.capture_id,
+            "mode": self.mode,
+            "stages_ms": self.stages,
+            "total_ms": (self._last - self.started) // 1000000,
+            "info": self.info
+        }
@@ -1,5 +1,7 @@
 import os
+import rtc
 import wifi
+import adafruit_ntp
 
 class WiFiManager:
     """Handles WiFi connection"""
@@ -18,4 +20,19 @@ class WiFiManager:
             
         except Exception as e:
             print(f"WiFi Error: {e}")
-            return False
\ No newline at end of file
+            return False
+    
+    @staticmethod
+    def connected():
+        return wifi.radio.connected
+    
+    @staticmethod
+    def sync_clock(pool, tz_offset=0):
+        """Set the RTC over NTP so captures can be stamped with the time"""
+        try:
+            rtc.RTC().datetime = adafruit_ntp.NTP(pool, tz_offset=tz_offset).datetime
+            print("Clock set over NTP")
+            return True
+        except Exception as e:
+            print(f"NTP Error: {e}")
+            return False
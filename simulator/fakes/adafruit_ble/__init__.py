@@ -0,0 +1,90 @@
+"""Host stand-in for adafruit_ble, with one simulated central.
+
+The central plays the part of the desktop receiver: it connects as soon as
+the camera advertises, takes the camera's notifications and can write to
+its UART RX characteristic.
+"""
+
+import collections
+
+
+class SimulatedCentral:
+    def __init__(self):
+        # Set available to False to simulate the receiver going out of range
+        self.available = True
+        self.connected = False
+        # ATT MTU of the simulated connection, and the max_length of the
+        # camera's UART TX characteristic (StreamOut's default buffer_size)
+        self.mtu = 247
+        self.tx_max_length = 64
+        # Called with the bytes of every notification the camera sends, and
+        # when the camera drops the connection
+        self.on_notify = None
+        self.on_disconnect = None
+        self.notifications = 0
+        self.notified_bytes = 0
+        # Written by the central, waiting to be read by the camera's UART
+        self.to_peripheral = collections.deque()
+
+    def write(self, data):
+        """A GATT write to the camera's RX characteristic"""
+        self.to_peripheral.extend(data)
+
+    def notify(self, data):
+        if not self.connected:
+            raise ConnectionError("Not connected")
+        if len(data) > self.mtu - 3:
+            raise ValueError(f"Notification of {len(data)} bytes exceeds MTU {self.mtu}")
+        self.notifications += 1
+        self.notified_bytes += len(data)
+        if self.on_notify:
+            self.on_notify(bytes(data))
+
+
+central = SimulatedCentral()
+
+
+class _BleioConnection:
+    @property
+    def max_packet_length(self):
+        return central.mtu - 3
+
+
+class BLEConnection:
+    def __init__(self):
+        self._bleio_connection = _BleioConnection()
+
+    @property
+    def connected(self):
+        return central.connected
+
+    def disconnect(self):
+        central.connected = False
+        if central.on_disconnect:
+            central.on_disconnect()
+
+
+class BLERadio:
+    def __init__(self):
+        self.name = "CIRCUITPY"
+        self.advertising = False
+
+    @property
+    def connected(self):
+        if not central.available:
+            central.connected = False
+        elif self.advertising:
+            # The receiver connects as soon as it sees the advertisement
+            central.connected = True
+            self.advertising = False
+        return central.connected
+
+    @property
+    def connections(self):
+        return (BLEConnection(),) if self.connected else ()
+
+    def start_advertising(self, advertisement, scan_response=None, **kwargs):
+        self.advertising = True
+
+    def stop_advertising(self):
+        self.advertising = False
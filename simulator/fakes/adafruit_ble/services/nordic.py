@@ -0,0 +1,43 @@
+from adafruit_ble import central
+
+
+class _Characteristic:
+    @property
+    def max_length(self):
+        return central.tx_max_length
+
+    @property
+    def value(self):
+        return b""
+
+    @value.setter
+    def value(self, data):
+        # As _bleio.Characteristic does
+        if len(data) > self.max_length:
+            raise ValueError("Value length > max_length")
+        central.notify(data)
+
+
+class _BoundCharacteristic:
+    def __init__(self):
+        self.bound_characteristic = _Characteristic()
+
+
+class UARTService:
+    """Nordic UART service over the simulated central"""
+
+    def __init__(self):
+        self._tx = _BoundCharacteristic()
+
+    @property
+    def in_waiting(self):
+        return len(central.to_peripheral)
+
+    def read(self, nbytes=None):
+        count = len(central.to_peripheral) if nbytes is None else min(nbytes, len(central.to_peripheral))
+        return bytes(central.to_peripheral.popleft() for _ in range(count))
+
+    def write(self, data):
+        # The real service only sends 20 byte notifications
+        for offset in range(0, len(data), 20):
+            central.notify(data[offset:offset + 20])
@@ -0,0 +1,162 @@
+"""Host stand-in for adafruit_pycamera.
+
+Frames come from a synthetic scene and captures are random bytes of a JPEG's
+typical size, taking roughly as long as the board does. Buttons are pressed
+with press() from any thread; the next keys_debounce() picks the press up.
+"""
+
+import os
+import time
+import random
+import collections
+
+
+class SimulationStopped(Exception):
+    """Raised by keys_debounce() to end the firmware's asyncio tasks"""
+
+
+class Display:
+    width = 240
+    height = 240
+
+    def __init__(self):
+        self.root_group = None
+        self.auto_refresh = False
+        self.refreshes = 0
+
+    def refresh(self, *args, **kwargs):
+        self.refreshes += 1
+        return True
+
+
+class Button:
+    def __init__(self):
+        self.rose = False
+        self.fell = False
+        self.pressed = False
+        self.short_count = 0
+        self.long_press = False
+
+
+class Camera:
+    """The espcamera sensor settings the firmware touches"""
+
+    def __init__(self):
+        self.quality = 11
+
+
+class Frame:
+    """A 240x176 RGB565 preview frame: an 8x8 grid of flat-colored blocks"""
+
+    width = 240
+    height = 176
+
+    def __init__(self, seed):
+        rng = random.Random(seed)
+        # Stored byte-swapped, as the camera sends pixels to the display
+        self._blocks = [rng.getrandbits(16) for _ in range(64)]
+
+    def __getitem__(self, xy):
+        x, y = xy
+        return self._blocks[(y * 8 // self.height) * 8 + x * 8 // self.width]
+
+
+class PyCamera:
+    resolutions = (
+        "240x240", "320x240", "640x480", "800x600", "1024x768", "1280x720",
+        "1280x1024", "1600x1200", "1920x1080", "2048x1536", "2560x1440",
+        "2560x1600", "1080x1920", "2560x1920",
+    )
+
+    def __init__(self):
+        self.display = Display()
+        self.camera = Camera()
+        self._resolution = 0
+        self.shutter = Button()
+        self.up = Button()
+        self.down = Button()
+        self.left = Button()
+        self.right = Button()
+        self.select = Button()
+        self.ok = Button()
+
+        # Seconds a preview frame and a full capture block for
+        self.frame_seconds = 1 / 30
+        self.capture_seconds_per_megapixel = 0.25
+        # Fixed capture size in bytes, or None to estimate it from the
+        # resolution and JPEG quality
+        self.jpeg_bytes = None
+        self.scene = 0
+        self.frames = 0
+        self.captures = 0
+        self.tones = []
+        self.polling = False
+
+        self._presses = collections.deque()
+        self._stop = False
+
+    @property
+    def resolution(self):
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value):
+        if isinstance(value, str):
+            value = self.resolutions.index(value)
+        self._resolution = value
+
+    def press(self, name):
+        """Press and release a button: shutter, up, down, left, right, select or ok"""
+        if not hasattr(self, name) or not isinstance(getattr(self, name), Button):
+            raise ValueError(f"No button named {name}")
+        self._presses.append(name)
+
+    def new_scene(self):
+        """Point the camera at something else, so the preview frame changes"""
+        self.scene += 1
+
+    def stop(self):
+        self._stop = True
+
+    def keys_debounce(self):
+        self.polling = True
+        if self._stop:
+            raise SimulationStopped()
+
+        for button in (self.shutter, self.up, self.down, self.left, self.right, self.select, self.ok):
+            button.rose = button.fell = False
+            button.short_count = 0
+
+        if self._presses:
+            button = getattr(self, self._presses.popleft())
+            if button is self.shutter:
+                button.short_count = 1
+            else:
+                button.rose = True
+
+    def live_preview_mode(self):
+        pass
+
+    def continuous_capture(self):
+        time.sleep(self.frame_seconds)
+        self.frames += 1
+        return Frame(self.scene)
+
+    def blit(self, bitmap, x_offset=0, y_offset=32):
+        pass
+
+    def capture_into_jpeg(self):
+        width, height = (int(n) for n in self.resolutions[self._resolution].split("x"))
+        time.sleep(width * height / 1e6 * self.capture_seconds_per_megapixel)
+        size = self.jpeg_bytes or estimate_jpeg_bytes(width, height, self.camera.quality)
+        self.captures += 1
+        return b"\xff\xd8" + os.urandom(max(0, size - 4)) + b"\xff\xd9"
+
+    def tone(self, frequency, duration):
+        self.tones.append(frequency)
+        time.sleep(duration)
+
+
+def estimate_jpeg_bytes(width, height, quality):
+    """Typical OV5640 JPEG size; lower quality numbers are finer"""
+    return int(width * height * max(0.03, 0.2 - quality * 0.005))
@@ -0,0 +1,16 @@
+"""Host stand-in for CircuitPython's rtc module; the host clock is left alone"""
+
+import time
+
+
+class RTC:
+    # The last time the firmware set, if any
+    set_to = None
+
+    @property
+    def datetime(self):
+        return time.localtime()
+
+    @datetime.setter
+    def datetime(self, value):
+        RTC.set_to = value
@@ -0,0 +1,72 @@
+"""Host stand-in for CircuitPython's socketpool module, backed by CPython sockets.
+
+Only hosts listed in HOSTS resolve, so a simulation never reaches the real
+internet: the harness maps the Gemini host to the local stand-in server.
+"""
+
+import errno
+import socket as _socket
+
+# Hostname -> (address, port) it is redirected to, whatever port is asked for
+HOSTS = {}
+
+
+class Socket:
+    """A CPython socket that fails like the board's when WiFi is down"""
+
+    def __init__(self, pool, sock):
+        self._pool = pool
+        self._sock = sock
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def _check(self):
+        if not self._pool.radio.connected:
+            raise OSError(errno.ENOTCONN, "WiFi is not connected")
+
+    def connect(self, address):
+        self._check()
+        # TLS sockets on the board connect by hostname
+        self._sock.connect(self._pool.resolve(*address))
+
+    def send(self, data):
+        self._check()
+        return self._sock.send(data)
+
+    def recv_into(self, buffer, nbytes=0):
+        self._check()
+        return self._sock.recv_into(buffer, nbytes)
+
+
+class SocketPool:
+    AF_INET = _socket.AF_INET
+    SOCK_STREAM = _socket.SOCK_STREAM
+    SOCK_DGRAM = _socket.SOCK_DGRAM
+    IPPROTO_TCP = _socket.IPPROTO_TCP
+    IPPROTO_UDP = _socket.IPPROTO_UDP
+    SOL_SOCKET = _socket.SOL_SOCKET
+    SO_REUSEADDR = _socket.SO_REUSEADDR
+    TCP_NODELAY = _socket.TCP_NODELAY
+    EAI_NONAME = -2
+
+    gaierror = _socket.gaierror
+
+    def __init__(self, radio):
+        self.radio = radio
+
+    def resolve(self, host, port):
+        if host in HOSTS:
+            return HOSTS[host]
+        if host in ("127.0.0.1", "localhost"):
+            return host, port
+        raise _socket.gaierror(self.EAI_NONAME, f"Name or service not known: {host}")
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        if not self.radio.connected:
+            raise OSError(errno.ENETUNREACH, "WiFi is not connected")
+        address = self.resolve(host, port)
+        return [(self.AF_INET, type or self.SOCK_STREAM, proto, "", address)]
+
+    def socket(self, family=AF_INET, type=SOCK_STREAM, proto=0):
+        return Socket(self, _socket.socket(family, type, proto))
@@ -0,0 +1,33 @@
+"""Host stand-in for CircuitPython's wifi module"""
+
+
+class Radio:
+    """The board's WiFi radio; the host's own network does the work.
+
+    Set available to False to simulate the access point going away: the
+    connection drops and connect() fails until it is back.
+    """
+
+    def __init__(self):
+        self.available = True
+        self.ipv4_address = None
+        self.ipv4_dns = "127.0.0.1"
+        self._connected = False
+
+    @property
+    def connected(self):
+        return self._connected and self.available
+
+    def connect(self, ssid, password=None, **kwargs):
+        if not self.available:
+            self._connected = False
+            raise ConnectionError("No network with that ssid")
+        self._connected = True
+        self.ipv4_address = "127.0.0.1"
+
+    def disconnect(self):
+        self._connected = False
+        self.ipv4_address = None
+
+
+radio = Radio()
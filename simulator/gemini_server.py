@@ -0,0 +1,172 @@
+"""
+Local stand-in for the Gemini API, for the firmware simulator.
+
+Answers generateContent, streamGenerateContent (server-sent events) and the
+model lookup the firmware uses as a keep-alive, over plain HTTP/1.1 with
+keep-alive connections. Every request body is parsed and its images
+base64-decoded, so a malformed streaming upload fails here as it would
+against Gemini. Latency and answer length are configurable:
+
+    python simulator/gemini_server.py --port 8080 --latency 2
+
+--slow-requests makes chosen requests wait --slow-latency seconds instead,
+longer than the firmware's timeout, to check that it recovers.
+"""
+
+import sys
+import json
+import time
+import random
+import base64
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+VOCABULARY = (
+    "the a small old bright wooden metal cup laptop window light table chair "
+    "plant book phone shelf warm quiet calm busy red blue green soft sharp "
+    "sits rests glows waits leans near beside under behind across room desk"
+).split()
+
+
+def answer(rng, words, sentence_words=8):
+    """Made-up sentences adding up to about the given number of words"""
+    sentences = []
+    while words > 0:
+        count = min(words, sentence_words)
+        sentence = " ".join(rng.choice(VOCABULARY) for _ in range(count))
+        sentences.append(sentence.capitalize() + ".")
+        words -= count
+    return " ".join(sentences)
+
+
+def candidate(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]}
+
+
+class GeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Set on the class by serve()
+    latency = 2.0
+    # 1-based numbers of the POSTs answered after slow_latency instead
+    slow_requests = ()
+    slow_latency = 0.0
+    posts = 0
+    words = 20
+    words_per_second = 40.0
+    rng = random.Random(1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, message):
+        print(f"[gemini] {status}: {message}", flush=True)
+        self._reply(status, {"error": {"code": status, "message": message}})
+
+    def do_GET(self):
+        if not self.headers.get("x-goog-api-key"):
+            return self._error(403, "Missing API key")
+        self._reply(200, {"name": self.path.split("/")[-1], "displayName": "Simulated model"})
+
+    def do_POST(self):
+        started = time.monotonic()
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        received = time.monotonic()
+
+        if not self.headers.get("x-goog-api-key"):
+            return self._error(403, "Missing API key")
+        try:
+            request = json.loads(body)
+            parts = request["contents"][0]["parts"]
+            images = [base64.b64decode(part["inline_data"]["data"], validate=True)
+                      for part in parts if "inline_data" in part]
+            prompt = parts[-1]["text"]
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            return self._error(400, f"Invalid request body: {e}")
+
+        GeminiHandler.posts += 1
+        number = GeminiHandler.posts
+        latency = self.slow_latency if number in self.slow_requests else self.latency
+        print(f"[gemini] {len(images)} image(s), {length} bytes in {received - started:.3f}s, "
+              f"answering in {latency:.1f}s: {prompt[:50]!r}", flush=True)
+        time.sleep(latency)
+
+        try:
+            self._answer(request, images)
+        except (BrokenPipeError, ConnectionResetError):
+            # The firmware gave up waiting and closed the connection
+            print(f"[gemini] request {number} abandoned by the client", flush=True)
+            self.close_connection = True
+
+    def _answer(self, request, images):
+        if request.get("generationConfig", {}).get("responseMimeType") == "application/json":
+            # A batch: one answer per image as a JSON array
+            text = json.dumps([answer(self.rng, self.words) for _ in images])
+        else:
+            text = answer(self.rng, self.words)
+
+        if ":streamGenerateContent" in self.path:
+            self._stream(text)
+        else:
+            self._reply(200, candidate(text))
+
+    def _stream(self, text):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        words = text.split(" ")
+        for i in range(0, len(words), 4):
+            piece = " ".join(words[i:i + 4]) + (" " if i + 4 < len(words) else "")
+            event = f"data: {json.dumps(candidate(piece))}\r\n\r\n".encode("utf-8")
+            self.wfile.write(f"{len(event):x}\r\n".encode("ascii") + event + b"\r\n")
+            self.wfile.flush()
+            time.sleep(4 / self.words_per_second)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def serve(port=0, latency=2.0, words=20, words_per_second=40.0, seed=1, slow_requests=(), slow_latency=0.0):
+    """Start the server and return it; call serve_forever() on it"""
+    GeminiHandler.latency = latency
+    GeminiHandler.slow_requests = tuple(slow_requests)
+    GeminiHandler.slow_latency = slow_latency
+    GeminiHandler.words = words
+    GeminiHandler.words_per_second = words_per_second
+    GeminiHandler.rng = random.Random(seed)
+    return ThreadingHTTPServer(("127.0.0.1", port), GeminiHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Gemini API")
+    parser.add_argument("--port", type=int, default=0, help="port to listen on (default: any free port)")
+    parser.add_argument("--latency", type=float, default=2.0, help="seconds before the first response byte")
+    parser.add_argument("--words", type=int, default=20, help="words per answer")
+    parser.add_argument("--words-per-second", type=float, default=40.0, help="streaming speed")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--slow-requests", type=int, nargs="*", default=[],
+                        help="numbers of the POSTs to answer after --slow-latency instead (1 is the first)")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="seconds before a slow request's first byte")
+    args = parser.parse_args()
+
+    server = serve(args.port, args.latency, args.words, args.words_per_second, args.seed,
+                   args.slow_requests, args.slow_latency)
+    # The simulator reads the port from this line
+    print(f"PORT {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,380 @@
+"""
+Host simulator for the Memento Cognitio firmware.
+
+Runs firmware/code.py unmodified under CPython. The board's hardware modules
+(adafruit_pycamera, adafruit_ble, wifi, socketpool and rtc) are replaced by
+the fakes in simulator/fakes; everything else is the CPython port of the same
+library (see requirements.txt). Gemini is replaced by gemini_server.py on
+localhost and BLE notifications go to a simulated receiver that decodes the
+frames.
+
+Interactively, type a button name (shutter, up, down, left, right, select,
+ok) and Enter to press it; "wifi off", "ble off" and their "on" forms
+simulate dropouts, "quit" stops:
+
+    pip install -r simulator/requirements.txt
+    python simulator/run.py
+
+The benchmark presses each prompt mode in turn, waits for its capture trace
+and reports per-stage latency and peak Python allocations (tracemalloc) for
+each mode and image size:
+
+    python simulator/run.py --benchmark --presses 3
+    python simulator/run.py --benchmark --modes shutter select --jpeg-bytes 20000 80000 150000
+
+With --slow-response the benchmark first has Gemini answer one capture
+after the firmware's timeout (shortened to --slow-timeout) and checks that
+the capture fails and the next one succeeds:
+
+    python simulator/run.py --benchmark --slow-response --modes shutter
+"""
+
+import os
+import ssl
+import sys
+import json
+import math
+import zlib
+import queue
+import shutil
+import tempfile
+import argparse
+import datetime
+import threading
+import subprocess
+import tracemalloc
+import importlib.util
+from pathlib import Path
+
+
+BASE_DIR = Path(__file__).parent.resolve()
+FAKES_DIR = BASE_DIR / "fakes"
+FIRMWARE_DIR = BASE_DIR.parent / "firmware"
+RESULTS_DIR = BASE_DIR / "results"
+
+# Fakes shadow any installed module of the same name
+sys.path[:0] = [str(FAKES_DIR), str(FIRMWARE_DIR)]
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile, or None for no values"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = min(len(ordered), max(1, math.ceil(fraction * len(ordered))))
+    return ordered[rank - 1]
+
+
+class LoopbackTLS:
+    """Stands in for ssl.SSLContext: the local Gemini server speaks plain HTTP"""
+
+    def wrap_socket(self, sock, server_hostname=None, **kwargs):
+        return sock
+
+
+class SimulatedReceiver:
+    """Decodes the camera's notifications the way bt-receiver does"""
+
+    def __init__(self, decode_frame, flags, verbose=True):
+        self.decode_frame = decode_frame
+        self.flags = flags
+        self.verbose = verbose
+        self.buffer = b""
+        self.messages = []
+        # Capture traces, for the benchmark to wait on
+        self.traces = queue.Queue()
+
+    def capabilities(self):
+        """The frame the receiver writes to the camera after connecting"""
+        return bytes([0x02, self.flags["capabilities"], 0, 0, 0, 1,
+                      self.flags["trace"] | self.flags["partial"] | self.flags["deflate"]])
+
+    def reset(self):
+        """Forget a partly received frame, as the receiver does on a new connection"""
+        self.buffer = b""
+
+    def feed(self, data):
+        self.buffer += data
+        while True:
+            frame = self.decode_frame(self.buffer)
+            if frame is None:
+                return
+            flags, message_id, payload, self.buffer = frame
+            if flags & self.flags["deflate"]:
+                payload = zlib.decompress(payload, -15)
+            text = payload.decode("utf-8")
+
+            if flags & self.flags["trace"]:
+                self.traces.put(json.loads(text))
+            elif text:
+                self.messages.append((message_id, text))
+                if self.verbose:
+                    print(f"[receiver] #{message_id}: {text}")
+
+
+def start_gemini_server(args):
+    command = [sys.executable, str(BASE_DIR / "gemini_server.py"), "--latency", str(args.latency),
+               "--words", str(args.words), "--words-per-second", str(args.words_per_second)]
+    if args.slow_response:
+        # The benchmark's first capture outlasts the firmware's timeout
+        command += ["--slow-requests", "1", "--slow-latency", str(args.slow_timeout * 2)]
+    server = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = server.stdout.readline()
+    if not line.startswith("PORT "):
+        server.kill()
+        raise RuntimeError("Gemini stand-in server did not start")
+    # Keep relaying what the server logs
+    threading.Thread(target=lambda: [print(line, end="") for line in server.stdout], daemon=True).start()
+    return server, int(line.split()[1])
+
+
+def load_firmware(args, state_dir, port):
+    """Configure the fakes and import code.py; returns (module, receiver)"""
+    os.environ.setdefault("GEMINI_API_KEY", "simulated")
+    os.environ.setdefault("CIRCUITPY_WIFI_SSID", "simulator")
+    os.environ.setdefault("CIRCUITPY_WIFI_PASSWORD", "")
+
+    # Paths on the SD card go to a scratch directory instead, and the
+    # benchmark needs framed messages and capture traces
+    import constants
+    constants.OFFLINE_QUEUE_DIR = str(state_dir / "offline")
+    constants.RESPONSE_CACHE_FILE = str(state_dir / "response_cache.json")
+    constants.BLE_FRAMED_MESSAGES = True
+    constants.BLE_SEND_TRACES = True
+    if args.no_cache:
+        constants.RESPONSE_CACHE_ENTRIES = 0
+    if args.slow_response:
+        constants.GEMINI_TIMEOUT = args.slow_timeout
+
+    import socketpool
+    import adafruit_ble
+    from manager import framing
+    from manager.llm import GEMINI_HOST
+    socketpool.HOSTS[GEMINI_HOST] = ("127.0.0.1", port)
+    ssl.create_default_context = lambda *a, **kwargs: LoopbackTLS()
+
+    receiver = SimulatedReceiver(framing.decode_frame, {
+        "trace": framing.FRAME_FLAG_TRACE,
+        "partial": framing.FRAME_FLAG_PARTIAL,
+        "deflate": framing.FRAME_FLAG_DEFLATE,
+        "capabilities": framing.FRAME_FLAG_CAPABILITIES,
+    }, verbose=not args.benchmark or args.verbose)
+    adafruit_ble.central.mtu = args.mtu
+    adafruit_ble.central.tx_max_length = args.tx_max_length
+    adafruit_ble.central.on_notify = receiver.feed
+    adafruit_ble.central.on_disconnect = receiver.reset
+    adafruit_ble.central.write(receiver.capabilities())
+
+    # Not imported as "code", which is a standard library module
+    spec = importlib.util.spec_from_file_location("firmware_code", FIRMWARE_DIR / "code.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module, receiver
+
+
+def interactive(app):
+    import wifi
+    import adafruit_ble
+
+    while True:
+        try:
+            command = input().strip().lower()
+        except EOFError:
+            command = "quit"
+
+        if command in ("quit", "exit"):
+            app.pycam.stop()
+            return
+        elif command in ("wifi off", "wifi on"):
+            wifi.radio.available = command.endswith("on")
+        elif command in ("ble off", "ble on"):
+            adafruit_ble.central.available = command.endswith("on")
+        elif command:
+            try:
+                app.pycam.new_scene()
+                app.pycam.press(command)
+            except ValueError as e:
+                print(e)
+
+
+def capture(pycam, receiver, mode, args):
+    """Press a button and wait for its trace; returns (trace, messages) or (None, messages)"""
+    sent = len(receiver.messages)
+    pycam.new_scene()
+    pycam.press(mode)
+    try:
+        trace = receiver.traces.get(timeout=args.timeout)
+    except queue.Empty:
+        trace = None
+    return trace, [text for _, text in receiver.messages[sent:]]
+
+
+def check_recovery(pycam, receiver, args, results):
+    """One capture Gemini answers too late, then one that must succeed"""
+    mode = (args.modes or list(app_modes()))[0]
+    print(f"Checking recovery from a response slower than {args.slow_timeout}s...")
+    slow, slow_messages = capture(pycam, receiver, mode, args)
+    after, after_messages = capture(pycam, receiver, mode, args)
+    failed = slow is not None and any(text.startswith("API Error") for text in slow_messages)
+    recovered = after is not None and bool(after_messages) and not any(
+        text.startswith("API Error") for text in after_messages)
+    results["recovery"] = {
+        "timeout_s": args.slow_timeout,
+        "slow_messages": slow_messages,
+        "next_messages": after_messages,
+        "slow_failed": failed,
+        "recovered": recovered,
+    }
+    print(f"  slow capture {'failed as expected' if failed else 'did not fail'}: {slow_messages[-1:]}")
+    print(f"  next capture {'succeeded' if recovered else 'did NOT succeed'}: {after_messages[-1:]}")
+
+
+def benchmark(app, receiver, args, results):
+    """Press every mode in turn, one capture in flight at a time"""
+    pycam = app.pycam
+    while not pycam.polling:
+        threading.Event().wait(0.05)
+    # Let the startup screen and beeps finish
+    threading.Event().wait(2)
+
+    modes = args.modes or list(app_modes())
+    try:
+        if args.slow_response:
+            check_recovery(pycam, receiver, args, results)
+        for size in args.jpeg_bytes or [None]:
+            for mode in modes:
+                key = f"{mode}@{size // 1000}kB" if size else mode
+                print(f"Benchmarking '{key}' ({args.presses} presses)...")
+                rows = results["modes"].setdefault(key, [])
+                for _ in range(args.presses):
+                    pycam.jpeg_bytes = size
+                    pycam.new_scene()
+                    if args.memory:
+                        tracemalloc.reset_peak()
+                        heap = tracemalloc.get_traced_memory()[0]
+                    pycam.press(mode)
+                    try:
+                        trace = receiver.traces.get(timeout=args.timeout)
+                    except queue.Empty:
+                        print(f"  no capture trace within {args.timeout}s")
+                        continue
+                    # Allocated on top of what the heap held at the press
+                    trace["peak_kb"] = (tracemalloc.get_traced_memory()[1] - heap) / 1024 if args.memory else None
+                    trace["jpeg_bytes"] = size
+                    rows.append(trace)
+    finally:
+        pycam.stop()
+
+
+def app_modes():
+    from constants import PROMPT_MODES
+    return PROMPT_MODES
+
+
+def summarize(results):
+    """p50 of every stage, total p50/p95 and the largest peak, per mode"""
+    summary = {}
+    for key, traces in results["modes"].items():
+        stages = {}
+        for trace in traces:
+            for stage, ms in trace["stages_ms"].items():
+                stages.setdefault(stage, []).append(ms)
+        totals = [trace["total_ms"] for trace in traces]
+        peaks = [trace["peak_kb"] for trace in traces if trace["peak_kb"] is not None]
+        ble = [trace["info"].get("ble_tx", {}).get("bytes", 0) for trace in traces]
+        summary[key] = {
+            "captures": len(traces),
+            "stages_p50_ms": {stage: percentile(values, 0.5) for stage, values in stages.items()},
+            "total_p50_ms": percentile(totals, 0.5),
+            "total_p95_ms": percentile(totals, 0.95),
+            "ble_bytes_p50": percentile(ble, 0.5),
+            "peak_kb": max(peaks) if peaks else None,
+        }
+    return summary
+
+
+def print_summary(summary):
+    stages = []
+    for row in summary.values():
+        stages += [stage for stage in row["stages_p50_ms"] if stage not in stages]
+
+    columns = stages + ["total_p50", "total_p95", "ble_bytes", "peak_kb"]
+    print(f"\n{'mode':<16} " + " ".join(f"{column:>9}" for column in columns))
+    for key, row in summary.items():
+        values = [row["stages_p50_ms"].get(stage) for stage in stages]
+        values += [row["total_p50_ms"], row["total_p95_ms"], row["ble_bytes_p50"], row["peak_kb"]]
+        print(f"{key:<16} " + " ".join("        -" if value is None else f"{value:>9.0f}" for value in values))
+    print("Stages are p50 milliseconds; peak_kb is the most a capture allocated above the heap at its press.")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run the Memento firmware on the host")
+    parser.add_argument("--benchmark", action="store_true", help="press every mode and report latency and memory")
+    parser.add_argument("--modes", nargs="*", help="prompt modes to benchmark (default: all)")
+    parser.add_argument("--presses", type=int, default=3, help="captures per mode and image size")
+    parser.add_argument("--jpeg-bytes", type=int, nargs="*",
+                        help="fixed capture sizes to benchmark (default: as the mode's profile captures)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false",
+                        help="skip tracemalloc, which slows everything down")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each capture")
+    parser.add_argument("--latency", type=float, default=2.0, help="Gemini stand-in seconds to first byte")
+    parser.add_argument("--words", type=int, default=20, help="words per Gemini stand-in answer")
+    parser.add_argument("--words-per-second", type=float, default=40.0, help="Gemini stand-in streaming speed")
+    parser.add_argument("--slow-response", action="store_true",
+                        help="first check that a capture Gemini answers after the timeout fails and the next succeeds")
+    parser.add_argument("--slow-timeout", type=float, default=5.0,
+                        help="firmware Gemini timeout in seconds for --slow-response")
+    parser.add_argument("--mtu", type=int, default=247, help="ATT MTU of the simulated BLE connection")
+    parser.add_argument("--tx-max-length", type=int, default=64,
+                        help="max_length of the camera's UART TX characteristic")
+    parser.add_argument("--output", type=Path, help="results file (default: results/results-<time>.json)")
+    parser.add_argument("--verbose", action="store_true", help="show received messages while benchmarking")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    server, port = start_gemini_server(args)
+    state_dir = Path(tempfile.mkdtemp(prefix="memento-sim-"))
+    results = {
+        "created": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "modes": {},
+    }
+
+    if args.benchmark and args.memory:
+        tracemalloc.start()
+    try:
+        module, receiver = load_firmware(args, state_dir, port)
+        from adafruit_pycamera import SimulationStopped
+
+        app = module.MementoCognitioApp()
+        if args.benchmark:
+            driver = threading.Thread(target=benchmark, args=(app, receiver, args, results), daemon=True)
+        else:
+            driver = threading.Thread(target=interactive, args=(app,), daemon=True)
+        driver.start()
+
+        try:
+            app.run()
+        except SimulationStopped:
+            pass
+    finally:
+        server.terminate()
+        shutil.rmtree(state_dir, ignore_errors=True)
+
+    if args.benchmark:
+        summary = summarize(results)
+        print_summary(summary)
+        results["summary"] = summary
+        output = args.output or RESULTS_DIR / f"results-{datetime.datetime.now():%Y%m%d-%H%M%S}.json"
+        output.parent.mkdir(parents=True, exist_ok=True)
+        output.write_text(json.dumps(results, indent=2, default=str))
+        print(f"Results saved to {output}")
+        if "recovery" in results and not results["recovery"]["recovered"]:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()